@@ -1,5 +1,6 @@
 from django import forms
 from .models import CustomUser
+from project.uploads import BoundedImageField
 
 class RetailAdminLoginForm(forms.Form):
     username = forms.CharField(
@@ -105,7 +106,7 @@ class RetailAdminRegisterForm(forms.Form):
             }
         ),
     )
-    profile_pic = forms.ImageField(
+    profile_pic = BoundedImageField(
         required=False,
         widget=forms.ClearableFileInput(
             attrs={
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from project.thumbnails import queue_renditions
+
+from .models import CustomUser
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_profile_pic(sender, instance, **kwargs):
+    # Read the raw value so deferred loads don't trigger a query; None = unknown
+    value = instance.__dict__.get('profile_pic')
+    instance._stored_profile_pic = getattr(value, 'name', value)
+
+
+@receiver(post_save, sender=CustomUser)
+def generate_profile_pic_renditions(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save last_login alone; only a new picture needs renditions
+    if update_fields is not None and 'profile_pic' not in update_fields:
+        return
+    old_name = instance._stored_profile_pic
+    if old_name is None and not created and 'profile_pic' not in instance.__dict__:
+        return
+    new_name = instance.profile_pic.name
+    if old_name == new_name:
+        return
+    instance._stored_profile_pic = new_name
+    queue_renditions(instance.profile_pic)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Cart, CartItem
+from django.db.models import Sum
+from .models import Cart, CartItem, line_total
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
@@ -8,6 +9,15 @@ class CartAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'user__email']
     readonly_fields = ['created_at']
     list_per_page = 20
+    list_select_related = ['user']
+
+    def get_queryset(self, request):
+        # Totals come from the changelist query instead of a query per cart
+        return super().get_queryset(request).annotate(cart_total=Sum(line_total('items__')))
+
+    @admin.display(description='Total price', ordering='cart_total')
+    def total_price(self, obj):
+        return obj.cart_total or 0
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
@@ -16,4 +26,5 @@ class CartItemAdmin(admin.ModelAdmin):
     search_fields = ['product__name', 'cart__user__username']
     readonly_fields = []
     list_per_page = 20
-    autocomplete_fields = ['product']  # ADD for better product selection
\ No newline at end of file
+    autocomplete_fields = ['product']  # ADD for better product selection
+    list_select_related = ['cart__user', 'product']
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BuyerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'buyer'
+
+    def ready(self):
+        from . import background_tasks, signals  # noqa: F401
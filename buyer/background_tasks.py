@@ -0,0 +1,58 @@
+import logging
+
+from background_task import background
+from background_task.models import Task
+from django.utils import timezone
+
+from shop.inventory import OutOfStock
+from shop.models import Order
+
+from . import payments
+from .checkout import mark_paid
+from .idempotency import purge_expired
+from .webhooks import process_pending
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_PURGE_INTERVAL = 60 * 60
+
+
+@background(schedule=IDEMPOTENCY_PURGE_INTERVAL)
+def purge_idempotency_keys():
+    purge_expired()
+
+
+def schedule_idempotency_purge():
+    """Make sure the repeating purge of expired idempotency keys is queued"""
+    if not Task.objects.filter(task_name=purge_idempotency_keys.name).exists():
+        purge_idempotency_keys(repeat=IDEMPOTENCY_PURGE_INTERVAL)
+
+
+@background(schedule=0, remove_existing_tasks=True)
+def verify_payment(checkout_id):
+    """Ask the payment gateway about a checkout and record the answer on its orders"""
+    orders = Order.objects.filter(checkout_id=checkout_id, payment_status='pending')
+    session_id = orders.exclude(stripe_session_id=None).values_list('stripe_session_id', flat=True).first()
+    if session_id is None:
+        return
+    status = payments.get_payment_gateway().payment_status(session_id)
+    if status == payments.PAID:
+        try:
+            mark_paid(orders)
+        except OutOfStock:
+            logger.error("Checkout %s was paid but its stock is gone", checkout_id)
+            raise
+    elif status == payments.FAILED:
+        orders.update(payment_status='failed', updated_at=timezone.now())
+
+
+@background(schedule=0)
+def process_webhook_events():
+    process_pending()
+
+
+def schedule_webhook_processing():
+    """Queue a processing run unless one is already waiting, so bursts share a run"""
+    waiting = Task.objects.filter(task_name=process_webhook_events.name, locked_by__isnull=True)
+    if not waiting.exists():
+        process_webhook_events()
@@ -0,0 +1,114 @@
+"""
+Turning a cart into orders.
+
+``place_orders`` does the whole checkout in one transaction: one query for
+the cart lines with their products and sellers, then either one
+conditional UPDATE that takes the stock for every line (matching fewer
+rows than there are lines when anything is short) or, for orders paid by
+card, stock reservations that are converted once payment succeeds (see
+shop.inventory). Orders and their items are bulk inserted. If any line
+cannot be filled nothing is written.
+"""
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from shop.background_tasks import schedule_best_seller_refresh, schedule_reservation_sweep
+from shop.inventory import OutOfStock, convert_reservations, reserve, short_products, take_stock
+from shop.models import CheckoutSession, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def place_orders(cart_items, customer, shipping_address, customer_phone, payment_method='cod'):
+    """
+    Create one order per seller from ``cart_items`` and remove them from the cart.
+
+    The orders share a CheckoutSession. Card orders only hold their stock
+    until they are paid. Raises CheckoutError, or OutOfStock when a product
+    cannot cover its line.
+    """
+    reserve_stock = payment_method == 'stripe'
+    lines = list(cart_items.select_related('product__seller'))
+    if not lines:
+        raise CheckoutError("No items selected for checkout.")
+
+    quantities = defaultdict(int)
+    by_seller = defaultdict(list)
+    for line in lines:
+        quantities[line.product_id] += line.quantity
+        by_seller[line.product.seller].append(line)
+
+    try:
+        with transaction.atomic():
+            if not reserve_stock and not take_stock(quantities):
+                # Roll back the rows that were decremented
+                raise OutOfStock([])
+
+            checkout = CheckoutSession.objects.create(customer=customer, payment_method=payment_method)
+            orders = Order.objects.bulk_create([
+                Order(
+                    order_number=Order.generate_order_number(),
+                    checkout=checkout,
+                    customer=customer,
+                    seller=seller,
+                    total_amount=sum(line.product.price * line.quantity for line in seller_lines),
+                    shipping_address=shipping_address,
+                    customer_phone=customer_phone,
+                    status='pending',
+                    payment_status='pending' if reserve_stock else 'unpaid',
+                )
+                for seller, seller_lines in by_seller.items()
+            ])
+            order_items = OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=line.product, quantity=line.quantity, price=line.product.price)
+                for order, seller_lines in zip(orders, by_seller.values())
+                for line in seller_lines
+            ])
+            if reserve_stock:
+                reserve(order_items)
+                transaction.on_commit(schedule_reservation_sweep)
+            cart_items.model.objects.filter(pk__in=[line.pk for line in lines]).delete()
+            transaction.on_commit(schedule_best_seller_refresh)
+    except OutOfStock as e:
+        if e.products:
+            raise
+        raise OutOfStock(short_products(quantities)) from None
+    return orders
+
+
+def mark_paid(orders):
+    """
+    Record payment for the orders not yet marked paid, all or nothing.
+
+    Card orders take their reserved stock here, once: an order already paid
+    is left alone however far it has moved on. Only pending orders change
+    status; ones the seller has confirmed or shipped keep theirs. Orders
+    cancelled before the payment arrived are flagged ``refund_due`` and
+    logged as errors. Returns how many orders were marked paid.
+    """
+    with transaction.atomic():
+        unpaid = list(
+            orders.select_for_update()
+            .exclude(payment_status__in=['paid', 'refund_due'])
+            .values_list('id', 'order_number', 'stripe_session_id', 'status')
+        )
+        live = [row for row in unpaid if row[3] != 'cancelled']
+        cancelled = [row for row in unpaid if row[3] == 'cancelled']
+        convert_reservations([order_id for order_id, _, session_id, _ in live if session_id is not None])
+        now = timezone.now()
+        live_ids = [row[0] for row in live]
+        Order.objects.filter(id__in=live_ids, status='pending').update(status='paid', updated_at=now)
+        Order.objects.filter(id__in=live_ids).update(payment_status='paid', updated_at=now)
+        if cancelled:
+            # Paid after its hold ran out: nothing is shipped, so the money goes back
+            Order.objects.filter(id__in=[row[0] for row in cancelled]).update(payment_status='refund_due', updated_at=now)
+            for _, order_number, session_id, _ in cancelled:
+                logger.error("Order %s was paid (session %s) after it was cancelled; refund due", order_number, session_id)
+        return len(live)
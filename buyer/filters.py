@@ -0,0 +1,110 @@
+import hashlib
+
+import django_filters
+from django.db.models import Count, Q
+
+from shop import cache as catalog_cache
+from shop.models import Product
+
+SORT_CHOICES = [
+    ('newest', 'Newest'),
+    ('price_asc', 'Price: Low to High'),
+    ('price_desc', 'Price: High to Low'),
+]
+
+# Keyset orderings for each sort option, always ending on the unique id
+SORT_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'price_asc': ('price', 'id'),
+    'price_desc': ('-price', '-id'),
+}
+
+# (label, min_price, max_price) - min inclusive, max exclusive
+PRICE_BUCKETS = [
+    ('Under $25', None, 25),
+    ('$25 - $50', 25, 50),
+    ('$50 - $100', 50, 100),
+    ('$100 - $250', 100, 250),
+    ('$250 & above', 250, None),
+]
+
+
+class ProductFilter(django_filters.FilterSet):
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lt')
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+    seller = django_filters.NumberFilter(field_name='seller_id')
+    sort = django_filters.ChoiceFilter(choices=SORT_CHOICES, method='filter_sort')
+
+    class Meta:
+        model = Product
+        fields = []
+
+    def filter_in_stock(self, queryset, name, value):
+        if value:
+            return queryset.filter(stock_quantity__gt=0)
+        return queryset
+
+    def filter_sort(self, queryset, name, value):
+        # Ordering is applied by the keyset paginator, see get_ordering()
+        return queryset
+
+    def get_ordering(self, default=SORT_ORDERINGS['newest']):
+        sort = self.form.cleaned_data.get('sort') if self.is_valid() else None
+        return SORT_ORDERINGS.get(sort, default)
+
+
+def _bucket_filter(min_price, max_price):
+    condition = Q()
+    if min_price is not None:
+        condition &= Q(price__gte=min_price)
+    if max_price is not None:
+        condition &= Q(price__lt=max_price)
+    return condition
+
+
+def get_facets(filterset, search_query=''):
+    """
+    Seller and price bucket counts for the catalog sidebar.
+
+    Counts are taken over the searched catalog with only the in-stock
+    filter applied, so picking a seller or price range does not hide the
+    other options. Everything comes from one grouped query and is cached
+    per search/in-stock signature until the catalog changes.
+    """
+    in_stock = bool(filterset.is_valid() and filterset.form.cleaned_data.get('in_stock'))
+    signature = hashlib.sha1(f"{search_query.strip().lower()}|{in_stock}".encode()).hexdigest()
+    return catalog_cache.get_list('facets', signature, lambda: _count_facets(filterset.queryset, in_stock))
+
+
+def _count_facets(queryset, in_stock):
+    """Seller and price bucket counts from a single grouped query"""
+    if in_stock:
+        queryset = queryset.filter(stock_quantity__gt=0)
+
+    bucket_counts = {
+        f'bucket_{index}': Count('id', filter=_bucket_filter(min_price, max_price))
+        for index, (_, min_price, max_price) in enumerate(PRICE_BUCKETS)
+    }
+    rows = (
+        queryset.order_by()
+        .values('seller_id', 'seller__username')
+        .annotate(total=Count('id'), **bucket_counts)
+    )
+
+    sellers = []
+    price_buckets = [
+        {'label': label, 'min_price': min_price, 'max_price': max_price, 'count': 0}
+        for label, min_price, max_price in PRICE_BUCKETS
+    ]
+    for row in rows:
+        sellers.append({'id': row['seller_id'], 'name': row['seller__username'], 'count': row['total']})
+        for index, bucket in enumerate(price_buckets):
+            bucket['count'] += row[f'bucket_{index}']
+    sellers.sort(key=lambda seller: (-seller['count'], seller['name']))
+
+    return {
+        'total': sum(seller['count'] for seller in sellers),
+        'sellers': sellers,
+        'price_buckets': price_buckets,
+    }
@@ -0,0 +1,100 @@
+"""
+Idempotent form submissions.
+
+Forms that must not run twice (checkout) carry a random key. The first
+POST with a key claims it by inserting an ``IdempotentRequest`` row - the
+unique (user, key) index makes the claim atomic - and stores the response
+once the work is done. A repeated POST (a double click, a resubmitted
+page) gets that stored response back instead of doing the work again; if
+it arrives while the first one is still running it waits for its result.
+Keys expire after ``IDEMPOTENCY_KEY_TTL`` seconds and are purged in bulk
+by a background task.
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import IdempotentRequest
+
+DEFAULT_TTL = 24 * 60 * 60
+WAIT_TIMEOUT = 10
+WAIT_INTERVAL = 0.25
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL))
+
+
+def _to_response(record):
+    response = HttpResponse(record.body, status=record.status_code, content_type=record.content_type or None)
+    if record.location:
+        response['Location'] = record.location
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def replay(user, key, wait=False):
+    """The stored response for ``key``, waiting for an unfinished one if asked"""
+    deadline = time.monotonic() + (WAIT_TIMEOUT if wait else 0)
+    while True:
+        record = IdempotentRequest.objects.filter(user=user, key=key, expires_at__gt=timezone.now()).first()
+        if record is None:
+            return None
+        if record.status_code is not None:
+            return _to_response(record)
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(WAIT_INTERVAL)
+
+
+def in_progress(user, key):
+    """Whether a submission holding ``key`` has not stored its response yet"""
+    return IdempotentRequest.objects.filter(
+        user=user, key=key, expires_at__gt=timezone.now(), status_code__isnull=True
+    ).exists()
+
+
+def claim(user, key):
+    """Claim ``key`` for this submission; None when another submission holds it"""
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotentRequest.objects.create(user=user, key=key, expires_at=timezone.now() + _ttl())
+        except IntegrityError:
+            # Only an expired key may be taken over
+            if not IdempotentRequest.objects.filter(user=user, key=key, expires_at__lte=timezone.now()).delete()[0]:
+                return None
+        else:
+            from .background_tasks import schedule_idempotency_purge
+            transaction.on_commit(schedule_idempotency_purge)
+            return record
+    return None
+
+
+def remember(record, response):
+    """Store ``response`` as the outcome of the claimed submission"""
+    IdempotentRequest.objects.filter(pk=record.pk).update(
+        status_code=response.status_code,
+        content_type=response.get('Content-Type', ''),
+        location=response.get('Location', ''),
+        body=response.content.decode(response.charset),
+    )
+    return response
+
+
+def release(record):
+    """Give the key back so the form can be submitted again, e.g. after an error"""
+    IdempotentRequest.objects.filter(pk=record.pk).delete()
+
+
+def purge_expired():
+    return IdempotentRequest.objects.filter(expires_at__lte=timezone.now()).delete()[0]
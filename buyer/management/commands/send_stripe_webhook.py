@@ -0,0 +1,45 @@
+import json
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import reverse
+
+from buyer.views import stripe_webhook
+from buyer.webhooks import FAILED_EVENTS, PAID_EVENTS, process_pending, sign_payload
+
+
+class Command(BaseCommand):
+    help = "Sign a Stripe checkout event locally and post it to the webhook endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('session_id', help="Stripe checkout session id stored on the orders")
+        parser.add_argument('--type', default='checkout.session.completed',
+                            choices=sorted(PAID_EVENTS | FAILED_EVENTS))
+        parser.add_argument('--payment-status', default='paid', choices=['paid', 'unpaid', 'no_payment_required'],
+                            help="payment_status of the session in the event")
+        parser.add_argument('--event-id', help="Reuse an id to simulate a redelivery")
+        parser.add_argument('--process', action='store_true',
+                            help="Process stored events now instead of waiting for the background task")
+
+    def handle(self, *args, **options):
+        event = {
+            'id': options['event_id'] or f"evt_test_{uuid.uuid4().hex[:24]}",
+            'type': options['type'],
+            'data': {'object': {
+                'id': options['session_id'],
+                'object': 'checkout.session',
+                'payment_status': options['payment_status'],
+            }},
+        }
+        payload = json.dumps(event).encode()
+        request = RequestFactory().post(
+            reverse('buyer:stripe_webhook'), payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=sign_payload(payload),
+        )
+        response = stripe_webhook(request)
+        if response.status_code != 200:
+            raise CommandError(f"Webhook rejected the event: {response.status_code} {response.content.decode()}")
+        self.stdout.write(f"Delivered {event['type']} as {event['id']}")
+        if options['process']:
+            self.stdout.write(f"Processed {process_pending()} event(s)")
@@ -1,9 +1,37 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Least
+from django.utils.functional import cached_property
 from django.contrib.auth import get_user_model
 from shop.models import Product
 
 User = get_user_model()
 
+CENTS = Decimal('0.01')
+
+
+def line_total(prefix=''):
+    """quantity x unit price, computed by the database; ``prefix`` reaches CartItem through a relation"""
+    return ExpressionWrapper(
+        F(f'{prefix}quantity') * F(f'{prefix}product__price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def summarize_items(items):
+    """Line count, unit count and grand total of a CartItem queryset in one query"""
+    summary = items.aggregate(
+        line_count=Count('id'),
+        item_count=Sum('quantity'),
+        total=Sum(line_total()),
+    )
+    summary['item_count'] = summary['item_count'] or 0
+    summary['total'] = (summary['total'] or Decimal('0')).quantize(CENTS)
+    return summary
+
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -11,16 +39,114 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart of {self.user.username}"
     
+    @cached_property
+    def lines(self):
+        """Cart items with their products and a database-computed ``line_total``"""
+        return list(
+            self.items.select_related('product')
+            .annotate(line_total=line_total())
+            .order_by('id')
+        )
+    
+    @cached_property
+    def summary(self):
+        """Totals for the cart, memoized on the instance for the rest of the request"""
+        if 'lines' in self.__dict__:
+            # The lines are already loaded, no need to ask the database again
+            return {
+                'line_count': len(self.lines),
+                'item_count': sum(line.quantity for line in self.lines),
+                'total': sum((line.line_total for line in self.lines), Decimal('0')).quantize(CENTS),
+            }
+        return summarize_items(self.items.all())
+    
+    def refresh_summary(self):
+        """Forget memoized lines and totals after the cart has changed"""
+        self.__dict__.pop('lines', None)
+        self.__dict__.pop('summary', None)
+    
     def total_price(self):
-        return sum(item.total_price() for item in self.items.all())
+        return self.summary['total']
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')  # Keep related_name
     quantity = models.PositiveIntegerField(default=1)
     
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+    
+    @classmethod
+    def add(cls, user, product, quantity=1):
+        """
+        Add ``quantity`` of a product to the user's cart, never beyond its stock.
+
+        The usual case - the product is already in the cart - is one UPDATE
+        that increments in the database, so concurrent adds cannot lose each
+        other's changes. Returns True when a new cart line was created.
+        """
+        stock = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('stock_quantity')[:1])
+        items = cls.objects.filter(cart__user=user, product=product)
+        if items.update(quantity=Least(F('quantity') + quantity, stock)):
+            return False
+        
+        cart, _ = Cart.objects.get_or_create(user=user)
+        try:
+            with transaction.atomic():
+                cls.objects.create(cart=cart, product=product, quantity=min(quantity, product.stock_quantity))
+            return True
+        except IntegrityError:
+            # Another request created the line first; add to it instead
+            items.update(quantity=Least(F('quantity') + quantity, stock))
+            return False
+    
     def total_price(self):
+        # Use the annotated value when the item came from Cart.lines
+        if hasattr(self, 'line_total'):
+            return self.line_total
         return self.product.price * self.quantity
     
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.product.name}"
+
+
+class IdempotentRequest(models.Model):
+    """The outcome of a form submission, replayed when the same key is posted again"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotent_requests')
+    key = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    # Empty until the first submission has finished
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=500, blank=True)
+    body = models.TextField(blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.key} for {self.user_id}"
+
+
+
+class WebhookEvent(models.Model):
+    """Raw payment provider event, stored on receipt and processed in batches"""
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # The worker picks up unprocessed events in arrival order
+            models.Index(fields=['processed_at', 'id'], name='webhook_event_pending'),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
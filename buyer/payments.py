@@ -0,0 +1,104 @@
+"""
+Payment gateways.
+
+Checkout talks to the payment provider only through the gateway named by
+the ``PAYMENT_GATEWAY`` setting. ``FakeGateway`` keeps everything local and
+drives the simulated card page; ``StripeGateway`` imports the Stripe SDK
+the first time it is used, so the SDK and its key are never touched at
+import time. Requests never wait on the provider to confirm a payment:
+that happens in webhooks and in the ``verify_payment`` background task,
+which store the outcome on the orders (``Order.payment_status``).
+"""
+import random
+import string
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+PAID = 'paid'
+PENDING = 'pending'
+FAILED = 'failed'
+
+
+@dataclass
+class PaymentSession:
+    id: str
+    # Where to send the buyer to pay; None means the simulated payment page
+    url: str = None
+    # When the session stops accepting payment; None means the caller's deadline held
+    expires_at: datetime = None
+
+
+class PaymentGateway:
+    def create_session(self, orders, success_url, cancel_url, expires_at=None):
+        """Start paying for ``orders``, payable until ``expires_at``; returns a PaymentSession"""
+        raise NotImplementedError
+
+    def payment_status(self, session_id):
+        """PAID, PENDING or FAILED for a session created by this gateway"""
+        raise NotImplementedError
+
+
+class FakeGateway(PaymentGateway):
+    """Local stand-in: sessions are random ids and payment happens on the simulated page"""
+
+    def create_session(self, orders, success_url, cancel_url, expires_at=None):
+        return PaymentSession('cs_test_' + ''.join(random.choices(string.ascii_lowercase + string.digits, k=24)))
+
+    def payment_status(self, session_id):
+        return PENDING
+
+
+class StripeGateway(PaymentGateway):
+    # Stripe rejects sessions that expire sooner than this after creation
+    MIN_SESSION_LIFETIME = timedelta(minutes=30, seconds=30)
+
+    @property
+    def stripe(self):
+        import stripe
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+        return stripe
+
+    def create_session(self, orders, success_url, cancel_url, expires_at=None):
+        if expires_at is not None:
+            expires_at = max(expires_at, timezone.now() + self.MIN_SESSION_LIFETIME)
+        session = self.stripe.checkout.Session.create(
+            mode='payment',
+            line_items=[
+                {
+                    'price_data': {
+                        'currency': getattr(settings, 'STRIPE_CURRENCY', 'usd'),
+                        'product_data': {'name': f"Order {order.order_number}"},
+                        'unit_amount': int(order.total_amount * 100),
+                    },
+                    'quantity': 1,
+                }
+                for order in orders
+            ],
+            success_url=success_url,
+            cancel_url=cancel_url,
+            client_reference_id=str(orders[0].checkout_id),
+            **({'expires_at': int(expires_at.timestamp())} if expires_at is not None else {}),
+        )
+        return PaymentSession(session.id, session.url, expires_at)
+
+    def payment_status(self, session_id):
+        session = self.stripe.checkout.Session.retrieve(session_id)
+        if session.payment_status in ('paid', 'no_payment_required'):
+            return PAID
+        if session.status == 'expired':
+            return FAILED
+        return PENDING
+
+
+_gateway = None
+
+
+def get_payment_gateway():
+    global _gateway
+    if _gateway is None:
+        _gateway = import_string(getattr(settings, 'PAYMENT_GATEWAY', 'buyer.payments.FakeGateway'))()
+    return _gateway
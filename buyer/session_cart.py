@@ -0,0 +1,131 @@
+"""
+Carts for visitors who are not logged in.
+
+An anonymous cart lives in the session as a compact ``{product_id: quantity}``
+mapping, so browsing and adding to cart never writes ``Cart``/``CartItem``
+rows. Products are looked up in one batched query when the cart is shown,
+which drops inactive products and clamps quantities to the current stock.
+On login the session cart is folded into the user's ``Cart`` with a single
+bulk upsert and removed from the session.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from shop.models import Product
+
+from .models import CENTS, Cart, CartItem
+
+SESSION_KEY = 'cart'
+
+
+class SessionCartLine:
+    """A cart line shaped like a CartItem from ``Cart.lines``; ``id`` is the product id"""
+
+    def __init__(self, product, quantity):
+        self.id = product.id
+        self.product = product
+        self.quantity = quantity
+        self.line_total = product.price * quantity
+
+    def total_price(self):
+        return self.line_total
+
+
+class SessionCart:
+    def __init__(self, session):
+        self.session = session
+        self.items = session.get(SESSION_KEY, {})
+
+    def __len__(self):
+        return len(self.items)
+
+    def save(self):
+        if self.items:
+            self.session[SESSION_KEY] = self.items
+        else:
+            self.session.pop(SESSION_KEY, None)
+        self.session.modified = True
+        self.__dict__.pop('lines', None)
+
+    def get(self, product_id):
+        return self.items.get(str(product_id), 0)
+
+    def set(self, product, quantity):
+        """Store ``quantity`` of a product, clamped to its stock; returns the stored value"""
+        quantity = max(0, min(quantity, product.stock_quantity))
+        if quantity:
+            self.items[str(product.id)] = quantity
+        else:
+            self.items.pop(str(product.id), None)
+        self.save()
+        return quantity
+
+    def add(self, product, quantity=1):
+        return self.set(product, self.get(product.id) + quantity)
+
+    def remove(self, product_id):
+        self.items.pop(str(product_id), None)
+        self.save()
+
+    def clear(self):
+        self.items = {}
+        self.save()
+
+    @cached_property
+    def lines(self):
+        """Current lines, validated against active products and stock in one query"""
+        products = Product.objects.filter(is_active=True).in_bulk([int(pk) for pk in self.items])
+        lines = []
+        for product_id, quantity in self.items.items():
+            product = products.get(int(product_id))
+            if product is None:
+                continue
+            quantity = min(quantity, product.stock_quantity)
+            if quantity > 0:
+                lines.append(SessionCartLine(product, quantity))
+        return lines
+
+    @property
+    def summary(self):
+        return {
+            'line_count': len(self.lines),
+            'item_count': sum(line.quantity for line in self.lines),
+            'total': sum((line.line_total for line in self.lines), Decimal('0')).quantize(CENTS),
+        }
+
+    def total_price(self):
+        return self.summary['total']
+
+
+def merge_into_user_cart(session, user):
+    """Move an anonymous session cart into the user's Cart; returns the lines merged"""
+    session_cart = SessionCart(session)
+    if not session_cart:
+        return 0
+
+    wanted = {int(product_id): quantity for product_id, quantity in session_cart.items.items()}
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        stock = dict(
+            Product.objects.filter(id__in=wanted, is_active=True).values_list('id', 'stock_quantity')
+        )
+
+        current = dict(cart.items.filter(product_id__in=stock).values_list('product_id', 'quantity'))
+
+        merged = []
+        for product_id, available in stock.items():
+            quantity = min(current.get(product_id, 0) + wanted[product_id], available)
+            if quantity > 0 and quantity != current.get(product_id):
+                merged.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+        # One INSERT .. ON CONFLICT (cart, product) DO UPDATE for every line
+        CartItem.objects.bulk_create(
+            merged,
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity'],
+        )
+
+    session_cart.clear()
+    return len(merged)
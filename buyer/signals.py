@@ -0,0 +1,11 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .session_cart import merge_into_user_cart
+
+
+@receiver(user_logged_in)
+def merge_session_cart(sender, request, user, **kwargs):
+    # Keep whatever a visitor put in their cart before logging in
+    if request is not None and hasattr(request, 'session') and user.is_buyer():
+        merge_into_user_cart(request.session, user)
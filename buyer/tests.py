@@ -1,3 +1,60 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase
+
+from buyer.models import CartItem
+from shop.models import Product
+
+User = get_user_model()
+
+
+class AddToCartConcurrencyTests(TransactionTestCase):
+    threads = 8
+    adds = 10
+
+    def setUp(self):
+        seller = User.objects.create_user('seller', role='seller')
+        self.buyer = User.objects.create_user('buyer', role='buyer')
+        self.product = Product.objects.create(
+            name='Racket', description='', price=1, image='', seller=seller,
+            stock_quantity=self.threads * self.adds,
+        )
+
+    def add_from_threads(self):
+        errors = []
+        barrier = threading.Barrier(self.threads)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(self.adds):
+                    CartItem.add(self.buyer, self.product)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return errors
+
+    def test_concurrent_adds_keep_one_line_and_every_increment(self):
+        errors = self.add_from_threads()
+
+        self.assertEqual(errors, [])
+        quantities = list(CartItem.objects.filter(cart__user=self.buyer).values_list('quantity', flat=True))
+        self.assertEqual(quantities, [self.threads * self.adds])
+
+    def test_concurrent_adds_stop_at_stock(self):
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=self.adds)
+
+        errors = self.add_from_threads()
+
+        self.assertEqual(errors, [])
+        quantities = list(CartItem.objects.filter(cart__user=self.buyer).values_list('quantity', flat=True))
+        self.assertEqual(quantities, [self.adds])
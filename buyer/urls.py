@@ -7,12 +7,15 @@ urlpatterns = [
     path('', views.root_redirect, name='root_redirect'),
     path('home/', views.dashboard, name='dashboard'),
     path('products/', views.product_list, name='product_list'),
+    path('products/feed/', views.product_feed, name='product_feed'),
+    path('products/suggest/', views.product_suggest, name='product_suggest'),
     path('products/<int:product_id>/', views.product_detail, name='product_detail'),
     path('cart/', views.cart_view, name='cart'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('remove-from-cart/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     # NEW URLS FOR ENHANCED CART
     path('update-quantity/<int:item_id>/', views.update_cart_item_quantity, name='update_quantity'),
+    path('cart/update/', views.update_cart, name='update_cart'),
     path('remove-single/<int:item_id>/', views.remove_single_quantity, name='remove_single'),
     # CHECKOUT URLS
     path('checkout/', views.checkout, name='checkout'),
@@ -25,4 +28,5 @@ urlpatterns = [
     path('checkout/cancel/<str:order_number>/', views.checkout_cancel, name='checkout_cancel'),
     
     path('stripe-payment/complete/<str:order_number>/', views.stripe_payment_complete, name='stripe_payment_complete'),
+    path('stripe/webhook/', views.stripe_webhook, name='stripe_webhook'),
 ]
\ No newline at end of file
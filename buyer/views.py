@@ -1,14 +1,31 @@
-import stripe 
+import hashlib
+import json
 
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from django.http import JsonResponse
-from django.conf import settings
+from django.db.models import Case, F, IntegerField, OuterRef, When
+from django.http import Http404, JsonResponse
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
-from .models import Cart, CartItem
-from shop.models import Product, Order, OrderItem
+from django.views.decorators.http import require_POST
+from . import idempotency, webhooks
+from .background_tasks import verify_payment
+from .checkout import CheckoutError, mark_paid, place_orders
+from .filters import ProductFilter, SORT_CHOICES, SORT_ORDERINGS, get_facets
+from .models import Cart, CartItem, summarize_items
+from .payments import FakeGateway, get_payment_gateway
+from .session_cart import SessionCart
+from shop import cache as catalog_cache
+from shop.inventory import OutOfStock, extend_reservations, held_quantity, release_reservations, reservation_deadline
+from shop.models import Product, Order
+from shop.sales import best_seller_ids
+from shop.search import get_search_backend
+from shop.suggest import get_suggest_index
+from project.pagination import paginate
 
 
 def root_redirect(request):
@@ -20,9 +37,20 @@ def root_redirect(request):
             return redirect('buyer:dashboard')
     return redirect('buyer:dashboard')
 
+FEATURED_COUNT = 8
+
 @login_required
 def dashboard(request):
-    featured_products = Product.objects.filter(is_active=True)[:8]
+    # Best sellers of the last week, topped up with the newest products
+    ranked_ids = best_seller_ids()[:FEATURED_COUNT]
+    ranked = Product.objects.filter(is_active=True).in_bulk(ranked_ids)
+    featured_products = [ranked[product_id] for product_id in ranked_ids if product_id in ranked]
+    if len(featured_products) < FEATURED_COUNT:
+        newest = catalog_cache.get_list(
+            'featured', 'newest',
+            lambda: list(Product.objects.filter(is_active=True).order_by('-created_at')[:FEATURED_COUNT]),
+        )
+        featured_products += [product for product in newest if product.id not in ranked][:FEATURED_COUNT - len(featured_products)]
     # Get recent orders for the dashboard
     recent_orders = Order.objects.filter(customer=request.user).order_by('-created_at')[:3]
     
@@ -32,33 +60,94 @@ def dashboard(request):
     }
     return render(request, 'buyer/dashboard.html', context)
 
-@login_required
-def product_list(request):
+def _catalog_page(request):
+    """Active products for the catalog, searched, filtered and keyset paginated"""
     products = Product.objects.filter(is_active=True)
+    ordering = SORT_ORDERINGS['newest']
     
-    # Search functionality
+    # Search functionality - ranked ids come from the search index
     search_query = request.GET.get('search', '')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
+        signature = hashlib.sha1(search_query.strip().lower().encode()).hexdigest()
+        product_ids = catalog_cache.get_list(
+            'search', signature, lambda: get_search_backend().search(search_query)
         )
+        products = products.filter(id__in=product_ids).annotate(
+            search_rank=Case(
+                *[When(id=product_id, then=rank) for rank, product_id in enumerate(product_ids)],
+                output_field=IntegerField(),
+            )
+        )
+        ordering = ('search_rank', 'id')
+    
+    filterset = ProductFilter(request.GET, queryset=products)
+    page = paginate(request, filterset.qs, filterset.get_ordering(default=ordering))
+    return page, filterset
+
+def product_list(request):
+    page, filterset = _catalog_page(request)
     
     context = {
-        'products': products,
+        'products': page,
+        'page': page,
+        'filter': filterset,
+        'facets': get_facets(filterset, request.GET.get('search', '')),
+        'sort_choices': SORT_CHOICES,
     }
     return render(request, 'buyer/product_list.html', context)
 
-@login_required
+def product_feed(request):
+    """JSON version of the catalog for infinite scroll"""
+    page, _ = _catalog_page(request)
+    
+    next_url = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_url = f"{reverse('buyer:product_feed')}?{params.urlencode()}"
+    
+    return JsonResponse({
+        'results': [
+            {
+                'id': product.id,
+                'name': product.name,
+                'price': str(product.price),
+                'image': product.image.url if product.image else None,
+                'stock_quantity': product.stock_quantity,
+                'url': reverse('buyer:product_detail', args=[product.id]),
+            }
+            for product in page
+        ],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'next': next_url,
+    })
+
+def product_suggest(request):
+    """Search-as-you-type product name suggestions from the in-memory index"""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), 20))
+    except ValueError:
+        limit = 8
+    query = request.GET.get('q', '')
+    return JsonResponse({
+        'query': query,
+        'results': get_suggest_index().suggest(query, limit),
+    })
+
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id, is_active=True)
+    product = catalog_cache.get_product(product_id)
+    if product is None:
+        raise Http404("Product not found")
     context = {
         'product': product,
     }
     return render(request, 'buyer/product_detail.html', context)
 
-@login_required
 def cart_view(request):
+    if not request.user.is_authenticated:
+        # Visitors get the session cart, see session_cart.py
+        return render(request, 'buyer/cart.html', {'cart': SessionCart(request.session)})
     if not request.user.is_buyer():
         messages.error(request, "Access denied. Buyer account required.")
         return redirect('accounts:retail_admin_login')
@@ -69,33 +158,39 @@ def cart_view(request):
     }
     return render(request, 'buyer/cart.html', context)
 
-@login_required
 def add_to_cart(request, product_id):
-    if not request.user.is_buyer():
+    if request.user.is_authenticated and not request.user.is_buyer():
         messages.error(request, "Access denied. Buyer account required.")
         return redirect('buyer:product_list')
     
-    product = get_object_or_404(Product, id=product_id, is_active=True)
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    
-    # Check if item already in cart
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart, 
-        product=product,
-        defaults={'quantity': 1}
-    )
+    product = catalog_cache.get_product(product_id)
+    if product is None:
+        raise Http404("Product not found")
+    if product.stock_quantity <= 0:
+        messages.error(request, f"Sorry, {product.name} is out of stock.")
+        return redirect('buyer:product_list')
+    if not request.user.is_authenticated:
+        session_cart = SessionCart(request.session)
+        if session_cart.get(product.id) >= product.stock_quantity:
+            messages.error(request, f"Only {product.stock_quantity} units of {product.name} are available.")
+        else:
+            session_cart.add(product)
+            messages.success(request, f"{product.name} added to cart!")
+        return redirect('buyer:product_list')
     
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
-        messages.success(request, f"Added another {product.name} to cart!")
-    else:
+    if CartItem.add(request.user, product):
         messages.success(request, f"{product.name} added to cart!")
+    else:
+        messages.success(request, f"Added another {product.name} to cart!")
     
     return redirect('buyer:product_list')
 
-@login_required
 def remove_from_cart(request, item_id):
+    if not request.user.is_authenticated:
+        # Session cart lines are keyed by product id
+        SessionCart(request.session).remove(item_id)
+        messages.success(request, "Item removed from cart!")
+        return redirect('buyer:cart')
     if not request.user.is_buyer():
         messages.error(request, "Access denied.")
         return redirect('buyer:product_list')
@@ -107,14 +202,17 @@ def remove_from_cart(request, item_id):
     messages.success(request, f"{product_name} removed from cart!")
     return redirect('buyer:cart')
 
-@login_required
 def update_cart_item_quantity(request, item_id):
     """Update quantity for a specific cart item with stock validation"""
+    if not request.user.is_authenticated:
+        return _update_session_cart_quantity(request, item_id)
     if not request.user.is_buyer():
         return JsonResponse({'error': 'Access denied'}, status=403)
     
     if request.method == 'POST':
-        cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+        cart_item = get_object_or_404(
+            CartItem.objects.select_related('product'), id=item_id, cart__user=request.user
+        )
         action = request.POST.get('action')
         
         if action == 'increase':
@@ -129,20 +227,162 @@ def update_cart_item_quantity(request, item_id):
             cart_item.quantity -= 1
         
         cart_item.save()
+        summary = summarize_items(CartItem.objects.filter(cart_id=cart_item.cart_id))
         
         return JsonResponse({
             'success': True,
             'quantity': cart_item.quantity,
             'item_total': float(cart_item.total_price()),
-            'cart_total': float(cart_item.cart.total_price()),
+            'cart_total': float(summary['total']),
+            'cart_item_count': summary['item_count'],
             'max_stock': cart_item.product.stock_quantity
         })
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
-@login_required
+MAX_CART_CHANGES = 100
+
+def _parse_cart_changes(request):
+    """{item_id: quantity} from a JSON body of {"changes": [{"item_id": .., "quantity": ..}]}"""
+    try:
+        changes = json.loads(request.body)['changes']
+        parsed = {int(change['item_id']): int(change['quantity']) for change in changes}
+    except (ValueError, KeyError, TypeError):
+        return None
+    if len(parsed) > MAX_CART_CHANGES or any(quantity < 0 for quantity in parsed.values()):
+        return None
+    return parsed
+
+@require_POST
+def update_cart(request):
+    """
+    Apply several quantity changes at once; a quantity of 0 removes the item.
+
+    The cart page batches +/- clicks client side and sends them here. All
+    changes are checked against stock with one query and either applied
+    together or rejected together.
+    """
+    if request.user.is_authenticated and not request.user.is_buyer():
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    changes = _parse_cart_changes(request)
+    if changes is None:
+        return JsonResponse({'success': False, 'error': 'Invalid changes'}, status=400)
+    if not request.user.is_authenticated:
+        return _update_session_cart(request, changes)
+    
+    with transaction.atomic():
+        items = {
+            item.id: item
+            for item in CartItem.objects.select_for_update()
+            .select_related('product')
+            .filter(id__in=changes, cart__user=request.user)
+        }
+        errors = _cart_change_errors(changes, {item_id: item.product for item_id, item in items.items()})
+        if errors:
+            return JsonResponse({'success': False, 'errors': errors}, status=400)
+        
+        to_update, to_delete = [], []
+        for item_id, quantity in changes.items():
+            item = items[item_id]
+            if quantity == 0:
+                to_delete.append(item_id)
+            elif quantity != item.quantity:
+                item.quantity = quantity
+                to_update.append(item)
+        CartItem.objects.bulk_update(to_update, ['quantity'])
+        if to_delete:
+            CartItem.objects.filter(id__in=to_delete).delete()
+        summary = summarize_items(CartItem.objects.filter(cart__user=request.user))
+    
+    return _cart_update_response(
+        [items[item_id] for item_id, quantity in changes.items() if quantity], summary
+    )
+
+def _cart_change_errors(changes, products):
+    """Per-item error messages for changes that do not fit the cart or the stock"""
+    errors = {}
+    for item_id, quantity in changes.items():
+        product = products.get(item_id)
+        if product is None:
+            errors[item_id] = 'Item is not in your cart'
+        elif quantity > product.stock_quantity:
+            errors[item_id] = f'Only {product.stock_quantity} items available in stock'
+    return errors
+
+def _update_session_cart(request, changes):
+    """update_cart for a visitor's session cart, where item ids are product ids"""
+    session_cart = SessionCart(request.session)
+    products = Product.objects.filter(is_active=True).in_bulk(
+        [product_id for product_id in changes if session_cart.get(product_id)]
+    )
+    errors = _cart_change_errors(changes, products)
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=400)
+    
+    for product_id, quantity in changes.items():
+        session_cart.set(products[product_id], quantity)
+    return _cart_update_response(
+        [line for line in session_cart.lines if line.id in changes], session_cart.summary
+    )
+
+def _cart_update_response(lines, summary):
+    return JsonResponse({
+        'success': True,
+        'items': [
+            {
+                'item_id': line.id,
+                'quantity': line.quantity,
+                'item_total': float(line.product.price * line.quantity),
+                'max_stock': line.product.stock_quantity,
+            }
+            for line in lines
+        ],
+        'cart_total': float(summary['total']),
+        'cart_item_count': summary['item_count'],
+    })
+
+def _update_session_cart_quantity(request, product_id):
+    """update_cart_item_quantity for a visitor's session cart"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    session_cart = SessionCart(request.session)
+    quantity = session_cart.get(product_id)
+    product = Product.objects.filter(id=product_id, is_active=True).first()
+    if product is None or not quantity:
+        return JsonResponse({'success': False, 'error': 'Item is not in your cart'}, status=404)
+    
+    action = request.POST.get('action')
+    if action == 'increase':
+        if quantity >= product.stock_quantity:
+            return JsonResponse({
+                'success': False,
+                'error': f'Only {product.stock_quantity} items available in stock'
+            }, status=400)
+        quantity += 1
+    elif action == 'decrease' and quantity > 1:
+        quantity -= 1
+    quantity = session_cart.set(product, quantity)
+    summary = session_cart.summary
+    
+    return JsonResponse({
+        'success': True,
+        'quantity': quantity,
+        'item_total': float(product.price * quantity),
+        'cart_total': float(summary['total']),
+        'cart_item_count': summary['item_count'],
+        'max_stock': product.stock_quantity
+    })
+
 def remove_single_quantity(request, item_id):
     """Remove one quantity of an item"""
+    if not request.user.is_authenticated:
+        session_cart = SessionCart(request.session)
+        product = Product.objects.filter(id=item_id).first()
+        if product is not None and session_cart.get(item_id):
+            session_cart.set(product, session_cart.get(item_id) - 1)
+            messages.success(request, f"Removed one {product.name} from cart!")
+        return redirect('buyer:cart')
     if not request.user.is_buyer():
         messages.error(request, "Access denied.")
         return redirect('buyer:cart')
@@ -161,8 +401,6 @@ def remove_single_quantity(request, item_id):
     return redirect('buyer:cart')
 
 # CHECKOUT VIEWS
-# Initialize Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 @login_required
 def checkout(request):
@@ -170,6 +408,17 @@ def checkout(request):
         messages.error(request, "Access denied. Buyer account required.")
         return redirect('accounts:retail_admin_login')
     
+    # A repeated "Place order" gets the first submission's result back, waiting
+    # for it if needed: the cart it emptied must not be validated again
+    idempotency_key = request.POST.get('idempotency_key', '') if request.method == 'POST' else ''
+    if idempotency_key:
+        replayed = idempotency.replay(request.user, idempotency_key, wait=True)
+        if replayed is not None:
+            return replayed
+        if idempotency.in_progress(request.user, idempotency_key):
+            messages.info(request, "Your order is still being placed.")
+            return redirect('buyer:order_history')
+    
     cart = get_object_or_404(Cart, user=request.user)
     
     if not cart.items.exists():
@@ -183,11 +432,14 @@ def checkout(request):
         cart_items = cart.items.filter(id__in=selected_item_ids)
     else:
         cart_items = cart.items.all()
+    cart_items = cart_items.select_related('product').annotate(
+        available=F('product__stock_quantity') - held_quantity(OuterRef('product_id'))
+    )
     
-    # Check stock availability
+    # Check stock availability, not counting units held for unpaid orders
     for item in cart_items:
-        if item.quantity > item.product.stock_quantity:
-            messages.error(request, f"Sorry, only {item.product.stock_quantity} units of {item.product.name} are available.")
+        if item.quantity > item.available:
+            messages.error(request, f"Sorry, only {max(item.available, 0)} units of {item.product.name} are available.")
             return redirect('buyer:cart')
     
     if request.method == 'POST':
@@ -197,9 +449,9 @@ def checkout(request):
         payment_method = request.POST.get('payment_method')
         
         # Validate required fields
-        if not all([shipping_address, customer_phone, customer_email, payment_method]):
+        if not all([shipping_address, customer_phone, customer_email]) or payment_method not in ('cod', 'stripe'):
             messages.error(request, "Please fill all required fields.")
-            return render(request, 'buyer/checkout.html', {'cart': cart})
+            return render(request, 'buyer/checkout.html', {'cart': cart, 'idempotency_key': idempotency_key})
         
         # Get selected items from POST
         selected_items_param = request.POST.get('selected_items', '')
@@ -209,134 +461,126 @@ def checkout(request):
         else:
             cart_items = cart.items.all()
         
-        if not cart_items.exists():
-            messages.error(request, "No items selected for checkout.")
-            return render(request, 'buyer/checkout.html', {'cart': cart})
+        claimed = None
+        if idempotency_key:
+            claimed = idempotency.claim(request.user, idempotency_key)
+            if claimed is None:
+                # The same submission is being processed right now
+                replayed = idempotency.replay(request.user, idempotency_key, wait=True)
+                if replayed is not None:
+                    return replayed
+                messages.info(request, "Your order is still being placed.")
+                return redirect('buyer:order_history')
         
         try:
-            # GROUP ITEMS BY SELLER - THIS IS THE KEY FIX
-            seller_items = {}
-            for cart_item in cart_items:
-                seller = cart_item.product.seller
-                if seller not in seller_items:
-                    seller_items[seller] = []
-                seller_items[seller].append(cart_item)
-            
-            created_orders = []
-            
-            # CREATE SEPARATE ORDER FOR EACH SELLER
-            for seller, seller_cart_items in seller_items.items():
-                # Calculate total for this seller's items
-                seller_total = sum(item.total_price() for item in seller_cart_items)
-                
-                # Create order for this seller
-                order = Order.objects.create(
-                    customer=request.user,
-                    seller=seller,  # Each order goes to its respective seller
-                    total_amount=seller_total,
-                    shipping_address=shipping_address,
-                    customer_phone=customer_phone,
-                    status='pending'
-                )
-                created_orders.append(order)
-                
-                # Create order items for this seller
-                for cart_item in seller_cart_items:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=cart_item.product,
-                        quantity=cart_item.quantity,
-                        price=cart_item.product.price
-                    )
-                    
-                    # Update product stock
-                    product = cart_item.product
-                    product.stock_quantity -= cart_item.quantity
-                    product.save()
-            
-            # Remove all purchased items from cart
-            cart_items.delete()
-            
-            # Handle payment method
-            if payment_method == 'cod':
-                # Cash on Delivery - all orders remain pending
-                messages.success(request, f"Order placed successfully! {len(created_orders)} separate orders created. Pay when you receive your items.")
-                # Redirect to first order's success page
-                return redirect('buyer:checkout_success', order_number=created_orders[0].order_number)
-                
-            elif payment_method == 'stripe':
-                # For Stripe, we need to handle multiple orders
-                # For now, we'll process the first order through Stripe simulation
-                # In a real scenario, you might create a combined Stripe session
-                
-                # Store fake session IDs for all orders
-                import random
-                import string
-                for order in created_orders:
-                    fake_session_id = 'cs_test_' + ''.join(random.choices(string.ascii_lowercase + string.digits, k=24))
-                    order.stripe_session_id = fake_session_id
-                    order.save()
-                
-                # Show simulated Stripe payment page for the combined total
-                combined_total = sum(order.total_amount for order in created_orders)
-                return render(request, 'buyer/stripe_simulation.html', {
-                    'orders': created_orders,
-                    'total_amount': combined_total,
-                    'customer_email': customer_email
-                })
-            
-        except Exception as e:
-            messages.error(request, f"Error creating orders: {str(e)}")
-            return render(request, 'buyer/checkout.html', {'cart': cart})
+            # One order per seller, stock taken atomically, see checkout.py
+            # Card payments only hold the stock until they are paid
+            created_orders = place_orders(
+                cart_items, request.user, shipping_address, customer_phone, payment_method
+            )
+        except (CheckoutError, OutOfStock) as e:
+            if claimed:
+                idempotency.release(claimed)
+            messages.error(request, str(e))
+            return redirect('buyer:cart')
+        
+        try:
+            response = _checkout_response(request, created_orders, payment_method, customer_email)
+        except Exception:
+            # E.g. the payment gateway failed; don't leave the key claimed until it expires
+            if claimed:
+                idempotency.release(claimed)
+            raise
+        if claimed:
+            idempotency.remember(claimed, response)
+        return response
     
     context = {
         'cart': cart,
+        'idempotency_key': idempotency.new_key(),
     }
     return render(request, 'buyer/checkout.html', context)
 
+def _checkout_response(request, created_orders, payment_method, customer_email):
+    """Where the buyer goes once their orders exist"""
+    if payment_method == 'stripe':
+        # One payment session covers every order of the checkout
+        first_order = created_orders[0]
+        success_url = request.build_absolute_uri(
+            reverse('buyer:checkout_success', args=[first_order.order_number])
+        ) + '?session_id={CHECKOUT_SESSION_ID}'
+        cancel_url = request.build_absolute_uri(reverse('buyer:checkout_cancel', args=[first_order.order_number]))
+        # The session stops taking payment when the stock hold runs out
+        order_ids = [order.id for order in created_orders]
+        session = get_payment_gateway().create_session(
+            created_orders, success_url, cancel_url, expires_at=reservation_deadline(order_ids)
+        )
+        if session.expires_at is not None:
+            extend_reservations(order_ids, session.expires_at)
+        Order.objects.filter(checkout_id=first_order.checkout_id).update(stripe_session_id=session.id)
+        for order in created_orders:
+            order.stripe_session_id = session.id
+        if session.url:
+            return redirect(session.url)
+        
+        # Show simulated Stripe payment page for the combined total
+        combined_total = sum(order.total_amount for order in created_orders)
+        return render(request, 'buyer/stripe_simulation.html', {
+            'orders': created_orders,
+            'total_amount': combined_total,
+            'customer_email': customer_email
+        })
+    
+    # Cash on Delivery - all orders remain pending
+    messages.success(request, f"Order placed successfully! {len(created_orders)} separate orders created. Pay when you receive your items.")
+    # Redirect to first order's success page
+    return redirect('buyer:checkout_success', order_number=created_orders[0].order_number)
+
 @login_required
-def checkout_success(request, order_number):
-    first_order = get_object_or_404(Order, order_number=order_number, customer=request.user)
+async def checkout_success(request, order_number):
+    """
+    Confirmation page. Never waits on the payment provider: an unconfirmed
+    card payment is checked by the verify_payment background task and the
+    page shows the status last recorded on the orders.
+    """
+    user = await request.auser()
+    first_order = await aget_object_or_404(
+        Order.objects.prefetch_related('items__product'), order_number=order_number, customer=user
+    )
     
     # Get all orders from this checkout session
-    recent_orders = Order.objects.filter(
-        customer=request.user,
-        created_at__gte=first_order.created_at
-    ).order_by('seller__username')
-    
-    # Check if this is a Stripe payment
-    session_id = request.GET.get('session_id')
-    if session_id:
-        try:
-            # Verify the Stripe payment
-            stripe_session = stripe.checkout.Session.retrieve(session_id)
-            
-            if stripe_session.payment_status == 'paid':
-                for order in recent_orders:
-                    order.status = 'paid'
-                    order.save()
-                messages.success(request, f"Payment successful! {recent_orders.count()} orders confirmed.")
-            else:
-                messages.warning(request, f"Payment pending. Your {recent_orders.count()} orders will be processed once payment is confirmed.")
-                
-        except Exception as e:
-            messages.info(request, f"Orders received! Payment verification in progress for {recent_orders.count()} orders.")
+    recent_orders = [
+        order async for order in first_order.checkout_orders()
+        .select_related('seller')
+        .prefetch_related('items')
+        .order_by('seller__username')
+    ]
+    
+    if any(order.payment_status == 'pending' for order in recent_orders):
+        if request.GET.get('session_id') and first_order.checkout_id:
+            await sync_to_async(verify_payment)(first_order.checkout_id)
+        messages.info(request, f"Orders received! Payment verification in progress for {len(recent_orders)} orders.")
+    elif any(order.payment_status == 'paid' for order in recent_orders):
+        messages.success(request, f"Payment successful! {len(recent_orders)} orders confirmed.")
     
     context = {
         'order': first_order,
         'all_orders': recent_orders,  # Pass all orders to template
     }
-    return render(request, 'buyer/checkout_success.html', context)
+    return await sync_to_async(render)(request, 'buyer/checkout_success.html', context)
 
 
 @login_required
 def checkout_cancel(request, order_number):
     order = get_object_or_404(Order, order_number=order_number, customer=request.user)
     
-    # Mark order as cancelled if it was a Stripe payment that failed
+    # Cancel the checkout's orders if its Stripe payment failed
     if order.stripe_session_id and order.status == 'pending':
-        order.status = 'cancelled'
-        order.save()
+        with transaction.atomic():
+            orders = order.checkout_orders().filter(status='pending')
+            order_ids = list(orders.values_list('id', flat=True))
+            orders.update(status='cancelled', updated_at=timezone.now())
+            release_reservations(order_ids)
         messages.info(request, "Payment was cancelled. Your order has been cancelled.")
     else:
         messages.info(request, "Checkout was cancelled.")
@@ -363,32 +607,37 @@ def order_detail(request, order_number):
     }
     return render(request, 'buyer/order_detail.html', context)
 
-# Dummy payment webhook for Stripe simulation
 @csrf_exempt
-@login_required
+@require_POST
 def stripe_webhook(request):
-    """Simulate Stripe payment webhook"""
-    if request.method == 'POST':
-        # In a real implementation, you'd verify the Stripe signature
-        # For now, we'll just simulate a successful payment
-        return JsonResponse({'status': 'success'})
+    """Store a verified Stripe event and acknowledge it; processing happens in the background"""
+    try:
+        webhooks.receive(request.body, request.headers.get('Stripe-Signature'))
+    except webhooks.SignatureError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'received': True})
     
     
 @login_required
+@require_POST
 def stripe_payment_complete(request, order_number):
+    # Only the simulated payment page may confirm a payment; real gateways
+    # are settled by their webhooks and verify_payment
+    if not isinstance(get_payment_gateway(), FakeGateway):
+        raise Http404("Payment is confirmed by the payment provider")
+    
     # Get the first order (we use this as reference)
     first_order = get_object_or_404(Order, order_number=order_number, customer=request.user)
     
     # Mark ALL orders from this checkout session as paid
-    # We find related orders by created_at time (orders created around the same time)
-    recent_orders = Order.objects.filter(
-        customer=request.user,
-        created_at__gte=first_order.created_at
-    ).exclude(status='paid')
-    
-    for order in recent_orders:
-        order.status = 'paid'
-        order.save()
-    
-    messages.success(request, f"Payment successful! {recent_orders.count()} orders have been confirmed.")
+    try:
+        paid_count = mark_paid(first_order.checkout_orders())
+    except OutOfStock as e:
+        messages.error(request, str(e))
+        return redirect('buyer:order_history')
+    
+    if not paid_count and first_order.checkout_orders().filter(payment_status='refund_due').exists():
+        messages.error(request, "Your order was cancelled before the payment arrived. The payment will be refunded.")
+        return redirect('buyer:order_history')
+    messages.success(request, f"Payment successful! {paid_count} orders have been confirmed.")
     return redirect('buyer:checkout_success', order_number=first_order.order_number)
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Stripe webhook ingestion.
+
+The webhook view only verifies the ``Stripe-Signature`` header against
+``STRIPE_WEBHOOK_SECRET`` and stores the raw event in ``WebhookEvent``;
+the unique event id makes redeliveries a no-op. Stripe gets its 200 right
+away. A background task then works through unprocessed events in batches,
+marking paid checkouts paid and expired or failed ones cancelled with one
+bulk update per outcome. A ``checkout.session.completed`` event only counts
+as paid when the session's ``payment_status`` is paid; delayed payment
+methods are settled by ``checkout.session.async_payment_succeeded``.
+
+Signatures are checked here rather than with the Stripe SDK, so test
+payloads can be signed locally with ``sign_payload``.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from shop.inventory import OutOfStock, release_reservations
+from shop.models import Order
+
+from .checkout import mark_paid
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_TOLERANCE = 300
+BATCH_SIZE = 100
+
+# A completed session is only paid when its payment_status says so; delayed
+# methods (bank debits and the like) complete unpaid and settle later
+COMPLETED_EVENT = 'checkout.session.completed'
+PAID_EVENTS = {COMPLETED_EVENT, 'checkout.session.async_payment_succeeded'}
+FAILED_EVENTS = {'checkout.session.expired', 'checkout.session.async_payment_failed'}
+SETTLED_PAYMENT_STATUSES = {'paid', 'no_payment_required'}
+
+
+class SignatureError(Exception):
+    pass
+
+
+def _signature(payload, secret, timestamp):
+    signed = f"{timestamp}.".encode() + payload
+    return hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+
+
+def sign_payload(payload, secret=None, timestamp=None):
+    """A Stripe-Signature header value for ``payload`` (bytes)"""
+    secret = secret or settings.STRIPE_WEBHOOK_SECRET
+    timestamp = int(timestamp or time.time())
+    return f"t={timestamp},v1={_signature(payload, secret, timestamp)}"
+
+
+def verify_signature(payload, header, secret=None, tolerance=SIGNATURE_TOLERANCE):
+    """Raise SignatureError unless ``header`` signs ``payload`` recently enough"""
+    secret = secret or settings.STRIPE_WEBHOOK_SECRET
+    timestamp, signatures = None, []
+    for part in (header or '').split(','):
+        key, _, value = part.strip().partition('=')
+        if key == 't':
+            timestamp = value
+        elif key == 'v1':
+            signatures.append(value)
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        raise SignatureError("Malformed signature header")
+    if abs(time.time() - int(timestamp)) > tolerance:
+        raise SignatureError("Signature timestamp outside the tolerance")
+    expected = _signature(payload, secret, timestamp)
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise SignatureError("No matching signature")
+
+
+def receive(payload, header):
+    """Verify and store one delivery; returns True if the event was new"""
+    verify_signature(payload, header)
+    try:
+        event = json.loads(payload)
+        event_id, event_type = event['id'], event['type']
+    except (ValueError, KeyError, TypeError):
+        raise SignatureError("Payload is not a Stripe event")
+    # Redeliveries hit the unique event_id and are dropped
+    _, created = WebhookEvent.objects.get_or_create(
+        event_id=event_id, defaults={'type': event_type, 'payload': event}
+    )
+    if created:
+        from .background_tasks import schedule_webhook_processing
+        transaction.on_commit(schedule_webhook_processing)
+    return created
+
+
+def _session(event):
+    return event.payload.get('data', {}).get('object', {})
+
+
+def _is_paid(event):
+    if event.type == COMPLETED_EVENT:
+        return _session(event).get('payment_status') in SETTLED_PAYMENT_STATUSES
+    return event.type in PAID_EVENTS
+
+
+def _session_ids(events, matches):
+    return {_session(event).get('id') for event in events if matches(event)} - {None}
+
+
+def process_batch(batch_size=BATCH_SIZE):
+    """Apply up to ``batch_size`` unprocessed events; returns how many were handled"""
+    events = list(WebhookEvent.objects.filter(processed_at__isnull=True).order_by('id')[:batch_size])
+    if not events:
+        return 0
+
+    paid = _session_ids(events, _is_paid)
+    failed = _session_ids(events, lambda event: event.type in FAILED_EVENTS) - paid
+    with transaction.atomic():
+        if paid:
+            _mark_sessions_paid(paid)
+        if failed:
+            now = timezone.now()
+            orders = Order.objects.filter(stripe_session_id__in=failed, payment_status='pending')
+            order_ids = list(orders.values_list('id', flat=True))
+            release_reservations(order_ids)
+            Order.objects.filter(id__in=order_ids).update(payment_status='failed', updated_at=now)
+            # Without their hold, orders nobody has started on can no longer be filled
+            Order.objects.filter(id__in=order_ids, status='pending').update(status='cancelled', updated_at=now)
+        WebhookEvent.objects.filter(id__in=[event.id for event in events]).update(processed_at=timezone.now())
+    return len(events)
+
+
+def _mark_sessions_paid(session_ids):
+    try:
+        mark_paid(Order.objects.filter(stripe_session_id__in=session_ids))
+    except OutOfStock:
+        # Settle what can be settled, one checkout at a time
+        for session_id in session_ids:
+            try:
+                mark_paid(Order.objects.filter(stripe_session_id=session_id))
+            except OutOfStock:
+                logger.error("Stripe session %s was paid but its stock is gone", session_id)
+
+
+def process_pending(batch_size=BATCH_SIZE):
+    total = 0
+    while handled := process_batch(batch_size):
+        total += handled
+    return total
@@ -0,0 +1,129 @@
+"""
+Serving of user-uploaded media.
+
+Replaces ``django.views.static.serve`` for ``MEDIA_URL`` with a view that
+sends validators (a strong ETag and Last-Modified), answers conditional
+requests with 304/412, supports single byte-range requests, and lets
+content-addressed files be cached forever. Whole files go out through
+``FileResponse`` so the server can use ``wsgi.file_wrapper``/``sendfile``.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=3600, must-revalidate'
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Content-addressed files (shop.storage) and their renditions start with a digest
+DIGEST_NAME_RE = re.compile(r'^[0-9a-f]{64}(?:_\d+)?\.\w+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _etag(name, stat):
+    basename = posixpath.basename(name)
+    if DIGEST_NAME_RE.match(basename):
+        # The name is derived from the content, so it identifies the bytes
+        tag = basename
+    else:
+        tag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+    return f'"{tag}"'
+
+
+def _is_immutable(request, name):
+    return bool(DIGEST_NAME_RE.match(posixpath.basename(name))) or 'v' in request.GET
+
+
+def _parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable range, None to ignore, or False"""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and int(mtime) <= if_range_date
+
+
+def _stream_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    name = posixpath.normpath(path).lstrip('/')
+    if any(part.startswith('.') for part in name.split('/')):
+        raise Http404("Media not found")
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(full_path)
+    except (ValueError, OSError):
+        raise Http404("Media not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Media not found")
+
+    etag = _etag(name, stat)
+    last_modified = int(stat.st_mtime)
+    cache_control = IMMUTABLE_CACHE_CONTROL if _is_immutable(request, name) else REVALIDATE_CACHE_CONTROL
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        byte_range = None
+        if 'Range' in request.headers and _if_range_matches(request, etag, stat.st_mtime):
+            byte_range = _parse_range(request.headers['Range'], stat.st_size)
+
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _stream_range(full_path, start, length), status=206, content_type=content_type
+            )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    response['Accept-Ranges'] = 'bytes'
+    return response
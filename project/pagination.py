@@ -0,0 +1,161 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, every page is fetched with a WHERE clause on the ordering
+columns of the last (or first) row already shown, so page N costs the same
+as page 1 as long as an index covers the ordering. Cursors are opaque,
+URL-safe strings carrying the direction and the ordering values of the
+boundary row.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 96
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, page_size, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``ordering``, e.g. ``('-created_at', '-id')``.
+
+    The last ordering field must be unique (normally the primary key) so
+    that every row has a distinct position.
+    """
+
+    def __init__(self, queryset, ordering=('-created_at', '-id'), page_size=DEFAULT_PAGE_SIZE):
+        self.queryset = queryset
+        self.ordering = [
+            (field[1:], True) if field.startswith('-') else (field, False)
+            for field in ordering
+        ]
+        self.page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+    def page(self, cursor=None):
+        direction, values = self.decode_cursor(cursor) if cursor else (NEXT, None)
+        backwards = direction == PREVIOUS
+
+        queryset = self.queryset.order_by(*self._order_by(reverse=backwards))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse=backwards))
+
+        # One extra row tells us whether there is another page in this direction
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([], self.page_size)
+
+        if backwards:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return KeysetPage(
+            rows,
+            self.page_size,
+            next_cursor=self.encode_cursor(NEXT, rows[-1]) if has_next else None,
+            previous_cursor=self.encode_cursor(PREVIOUS, rows[0]) if has_previous else None,
+        )
+
+    def _order_by(self, reverse=False):
+        return [
+            f"{'-' if descending != reverse else ''}{name}"
+            for name, descending in self.ordering
+        ]
+
+    def _after(self, values, reverse=False):
+        # (a, b) > (x, y) expands to a > x OR (a = x AND b > y)
+        condition = Q()
+        equal_so_far = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal_so_far & Q(**{f'{name}__{lookup}': value})
+            equal_so_far &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, direction, obj):
+        values = []
+        for name, _ in self.ordering:
+            value = getattr(obj, name)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        payload = json.dumps({'d': direction, 'v': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction, raw_values = payload['d'], payload['v']
+            if direction not in (NEXT, PREVIOUS) or len(raw_values) != len(self.ordering):
+                raise InvalidCursor(cursor)
+            return direction, [
+                self._to_python(name, value)
+                for (name, _), value in zip(self.ordering, raw_values)
+            ]
+        except (ValueError, KeyError, TypeError) as e:
+            raise InvalidCursor(cursor) from e
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations (e.g. a search rank) are plain numbers
+            return value
+        return field.to_python(value)
+
+
+def paginate(request, queryset, ordering=('-created_at', '-id')):
+    """Return the keyset page selected by ``?cursor=`` and ``?page_size=``"""
+    try:
+        page_size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+    paginator = KeysetPaginator(queryset, ordering, page_size)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return paginator.page()
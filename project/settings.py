@@ -95,6 +95,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Forked test processes cannot share an in-memory test database
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -138,6 +140,19 @@ STATIC_ROOT = BASE_DIR / "static"
 
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
+SERVE_MEDIA = False  # serve MEDIA_URL through project.media even when DEBUG is off
+
+# Process pool size for generating image renditions (None = one per CPU)
+THUMBNAIL_WORKERS = None
+
+# Uploads are size-checked while streaming and always spooled to disk
+FILE_UPLOAD_HANDLERS = [
+    'project.uploads.UploadSizeLimitHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+MAX_IMAGE_PIXELS = 25_000_000
+MAX_IMAGE_DIMENSION = 2560
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -158,7 +173,41 @@ DEFAULT_FROM_EMAIL = "sushantpahari06@gmail.com"
 
 MAX_ATTEMPTS = 3
 
+# Product search
+PRODUCT_SEARCH_BACKEND = 'shop.search.SQLiteFTSBackend'
+
+# Catalog cache - point CACHES at a shared backend (e.g. Redis) in production
+# so invalidation and the hit/miss counters span every worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    }
+}
+CATALOG_CACHE_TIMEOUT = 600
+
+# Search-as-you-type index (per worker process)
+SUGGEST_INDEX_TTL = 300
+SUGGEST_INDEX_MAX_ENTRIES = 400_000
+
+# Order numbers: a dotted path to a callable class, and how many sequence
+# values each process reserves at a time
+ORDER_NUMBER_GENERATOR = 'shop.order_numbers.BlockSequenceGenerator'
+ORDER_NUMBER_BLOCK_SIZE = 100
+
+# How long a repeated checkout submission replays the first one (seconds)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Stock held for unpaid card orders (seconds), and how often expired holds are swept.
+# The Stripe session expires with the hold, and Stripe needs it open for at least 30 minutes
+STOCK_RESERVATION_TTL = 30 * 60
+STOCK_RESERVATION_SWEEP_INTERVAL = 5 * 60
+
+
 
+# Payment gateway used by checkout: buyer.payments.FakeGateway (simulated card
+# page) or buyer.payments.StripeGateway
+PAYMENT_GATEWAY = 'buyer.payments.FakeGateway'
 
 # Stripe Configuration - TEST MODE
 STRIPE_PUBLISHABLE_KEY = 'pk_test_51P5l8hK1J5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y5y'
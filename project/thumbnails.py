@@ -0,0 +1,131 @@
+"""
+Resized renditions of uploaded images.
+
+When a product image or profile picture is saved, a background task
+renders it at each size in ``RENDITION_SIZES`` as WebP and JPEG and stores
+the results next to the original under ``<dir>/renditions/``. Resizing is
+CPU bound, so the task fans the work out over a process pool. Templates
+render a ``<picture>`` with the ``picture`` tag, offering WebP and JPEG
+and letting the browser choose, and fall back to the original until the
+renditions exist. Whether they exist is remembered in the cache, so pages
+do not touch storage for every image they show.
+"""
+import io
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+
+from background_task import background
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+RENDITION_SIZES = (128, 320, 640)
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Until renditions show up, storage is checked again after this many seconds
+MISSING_RECHECK = 60
+CACHE_KEY = 'renditions:{name}'
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=getattr(settings, 'THUMBNAIL_WORKERS', None))
+    return _pool
+
+
+def rendition_name(name, size, extension):
+    directory, filename = posixpath.split(name)
+    stem = os.path.splitext(filename)[0]
+    return posixpath.join(directory, 'renditions', f'{stem}_{size}.{extension}')
+
+
+def render(data, size, extension):
+    """Resize image bytes to fit ``size`` x ``size``; runs in a pool worker"""
+    image_format, options = RENDITION_FORMATS[extension]
+    with Image.open(io.BytesIO(data)) as image:
+        # Let JPEG decode at reduced scale instead of full resolution
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        if image_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background_layer = Image.new('RGB', image.size, (255, 255, 255))
+                background_layer.paste(image, mask=image.getchannel('A'))
+                image = background_layer
+            else:
+                image = image.convert('RGB')
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def _last_rendition(name):
+    # create_renditions stores this one last, so once it exists they all do
+    return rendition_name(name, RENDITION_SIZES[-1], list(RENDITION_FORMATS)[-1])
+
+
+def has_renditions(name):
+    key = CACHE_KEY.format(name=name)
+    exists = cache.get(key)
+    if exists is None:
+        exists = default_storage.exists(_last_rendition(name))
+        cache.set(key, exists, None if exists else MISSING_RECHECK)
+    return exists
+
+
+def create_renditions(storage, name):
+    """Render every missing rendition of ``name`` and store it"""
+    jobs = [
+        (size, extension)
+        for size in RENDITION_SIZES
+        for extension in RENDITION_FORMATS
+        if not default_storage.exists(rendition_name(name, size, extension))
+    ]
+    if not jobs:
+        cache.set(CACHE_KEY.format(name=name), True, None)
+        return 0
+    with storage.open(name, 'rb') as original:
+        data = original.read()
+    pool = _get_pool()
+    futures = [(size, extension, pool.submit(render, data, size, extension)) for size, extension in jobs]
+    for size, extension, future in futures:
+        default_storage.save(rendition_name(name, size, extension), ContentFile(future.result()))
+    cache.set(CACHE_KEY.format(name=name), True, None)
+    return len(jobs)
+
+
+def delete_renditions(name):
+    cache.delete(CACHE_KEY.format(name=name))
+    for size in RENDITION_SIZES:
+        for extension in RENDITION_FORMATS:
+            default_storage.delete(rendition_name(name, size, extension))
+
+
+@background(schedule=0)
+def generate_renditions(name):
+    create_renditions(default_storage, name)
+
+
+def queue_renditions(fieldfile):
+    """Queue rendition generation for a saved image unless it is already done"""
+    if fieldfile and not has_renditions(fieldfile.name):
+        generate_renditions(fieldfile.name)
+
+
+def best_rendition(name, box, extension='webp'):
+    """Name of the smallest rendition sharp at ``box`` CSS pixels on 2x screens"""
+    if not has_renditions(name):
+        return None
+    wanted = box * 2
+    size = next((size for size in RENDITION_SIZES if size >= wanted), RENDITION_SIZES[-1])
+    return rendition_name(name, size, extension)
@@ -0,0 +1,133 @@
+"""
+Memory-bounded handling of image uploads.
+
+``UploadSizeLimitHandler`` sits in front of Django's temporary-file handler
+and stops passing on a file that grows past ``MAX_UPLOAD_SIZE`` while it
+is still being received, so oversized uploads never reach the disk in full
+and nothing is buffered in memory. The form gets an empty
+``RejectedUpload`` in its place, which ``BoundedImageField`` reports as
+too large instead of as missing. ``BoundedImageField`` also validates the
+spooled file from its header alone - format and pixel count are known
+before any pixel data is decoded - and downsamples originals larger than
+``MAX_IMAGE_DIMENSION`` before they are stored.
+"""
+import logging
+import os
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+DEFAULT_MAX_IMAGE_PIXELS = 25_000_000
+DEFAULT_MAX_IMAGE_DIMENSION = 2560
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def max_upload_size():
+    return _setting('MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+
+
+class RejectedUpload(SimpleUploadedFile):
+    """Empty stand-in for a file that was dropped for exceeding MAX_UPLOAD_SIZE"""
+
+    def __init__(self, name, content_type, received):
+        super().__init__(name, b'', content_type)
+        self.received = received
+
+
+class UploadSizeLimitHandler(FileUploadHandler):
+    """Stop receiving a file as soon as more than MAX_UPLOAD_SIZE bytes have arrived"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if not self.rejected and self.received > max_upload_size():
+            logger.warning("Rejecting upload %r: larger than MAX_UPLOAD_SIZE", self.file_name)
+            self.rejected = True
+        if self.rejected:
+            # Returning None keeps the chunk from the handlers after this one
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        # The first handler to return a file wins, so the partial copy is never used
+        if self.rejected:
+            return RejectedUpload(self.file_name, self.content_type, self.received)
+        return None
+
+
+class BoundedImageField(forms.ImageField):
+    default_error_messages = {
+        'too_large': "Image is too large (%(pixels)s pixels); the limit is %(limit)s.",
+        'invalid_format': "Unsupported image format. Use JPEG, PNG, WebP or GIF.",
+        'file_too_large': "File too large (max %(limit)s MB).",
+    }
+
+    def to_python(self, data):
+        if isinstance(data, RejectedUpload):
+            raise ValidationError(
+                self.error_messages['file_too_large'], code='file_too_large',
+                params={'limit': f"{max_upload_size() / (1024 * 1024):g}"},
+            )
+        # Skip ImageField.to_python, which may read the whole file into memory
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+
+        source = f.temporary_file_path() if hasattr(f, 'temporary_file_path') else f
+        try:
+            # Image.open only parses the header; no pixel data is decoded yet
+            with Image.open(source) as image:
+                image_format = image.format
+                width, height = image.size
+                image.verify()
+        except Exception as exc:
+            raise ValidationError(self.error_messages['invalid_image'], code='invalid_image') from exc
+        finally:
+            if hasattr(f, 'seek') and callable(f.seek):
+                f.seek(0)
+
+        if image_format not in ALLOWED_FORMATS:
+            raise ValidationError(self.error_messages['invalid_format'], code='invalid_format')
+        limit = _setting('MAX_IMAGE_PIXELS', DEFAULT_MAX_IMAGE_PIXELS)
+        if width * height > limit:
+            raise ValidationError(
+                self.error_messages['too_large'], code='too_large',
+                params={'pixels': width * height, 'limit': limit},
+            )
+
+        if max(width, height) > _setting('MAX_IMAGE_DIMENSION', DEFAULT_MAX_IMAGE_DIMENSION):
+            f = self.downsample(f, source, image_format)
+
+        f.content_type = Image.MIME.get(image_format)
+        return f
+
+    def downsample(self, f, source, image_format):
+        """Replace an oversized original with a copy that fits MAX_IMAGE_DIMENSION"""
+        max_dimension = _setting('MAX_IMAGE_DIMENSION', DEFAULT_MAX_IMAGE_DIMENSION)
+        with Image.open(source) as image:
+            # JPEG can decode straight to a reduced scale
+            image.draft(image.mode, (max_dimension, max_dimension))
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            resized = TemporaryUploadedFile(
+                f.name, Image.MIME.get(image_format), 0, getattr(f, 'charset', None)
+            )
+            image.save(resized.file, image_format)
+        resized.file.flush()
+        resized.size = os.path.getsize(resized.temporary_file_path())
+        resized.seek(0)
+        return resized
@@ -0,0 +1,44 @@
+from background_task import background
+from background_task.models import Task
+from django.conf import settings
+
+from .inventory import release_expired
+from .sales import rank_best_sellers, roll_up_sales, roll_up_seller_sales
+
+BEST_SELLER_REFRESH_DELAY = 60
+BEST_SELLER_REFRESH_INTERVAL = 60 * 60
+RESERVATION_SWEEP_INTERVAL = 5 * 60
+
+
+@background(schedule=BEST_SELLER_REFRESH_DELAY)
+def refresh_best_sellers():
+    roll_up_sales()
+    rank_best_sellers()
+    roll_up_seller_sales()
+
+
+def schedule_best_seller_refresh():
+    """
+    Queue a refresh unless one is already waiting, so bursts of orders share a
+    run. Also make sure the repeating refresh is queued: the 7- and 30-day
+    windows are counted back from the day a refresh runs, so they must keep
+    moving even when no orders come in.
+    """
+    tasks = Task.objects.filter(task_name=refresh_best_sellers.name)
+    if not tasks.filter(locked_by__isnull=True, repeat=Task.NEVER).exists():
+        refresh_best_sellers()
+    if not tasks.filter(repeat__gt=Task.NEVER).exists():
+        interval = getattr(settings, 'BEST_SELLER_REFRESH_INTERVAL', BEST_SELLER_REFRESH_INTERVAL)
+        refresh_best_sellers(schedule=interval, repeat=interval)
+
+
+@background(schedule=0)
+def release_expired_reservations():
+    release_expired()
+
+
+def schedule_reservation_sweep():
+    """Make sure the repeating sweep of expired stock reservations is queued"""
+    if not Task.objects.filter(task_name=release_expired_reservations.name).exists():
+        interval = getattr(settings, 'STOCK_RESERVATION_SWEEP_INTERVAL', RESERVATION_SWEEP_INTERVAL)
+        release_expired_reservations(schedule=interval, repeat=interval)
@@ -0,0 +1,103 @@
+"""
+Read-through cache for the buyer catalog.
+
+Single products are cached under their own key and deleted when they
+change. Lists (featured products, search result ids, facet counts) embed a
+catalog-wide version number in their keys, so bumping that number on any
+product change retires every cached list at once without scanning for
+keys. Hits and misses are counted per kind of entry; ``catalog_cache_stats``
+prints them.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Product
+
+VERSION_KEY = 'catalog:version'
+STATS_KEY = 'catalog:stats:{kind}:{outcome}'
+KINDS = ('product', 'featured', 'search', 'facets', 'bestsellers')
+
+_MISSING = object()
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600)
+
+
+def _count(kind, outcome):
+    key = STATS_KEY.format(kind=kind, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so an evicted version never revives stale lists
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), None)
+
+
+def _read_through(kind, key, loader):
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count(kind, 'hits')
+        return value
+    _count(kind, 'misses')
+    value = loader()
+    cache.set(key, value, _timeout())
+    return value
+
+
+def get_list(kind, signature, loader):
+    """Cached result of ``loader()`` for a versioned catalog list"""
+    return _read_through(kind, f'catalog:{kind}:{catalog_version()}:{signature}', loader)
+
+
+def forget_list(kind, signature):
+    """Drop one cached list without retiring the rest of the catalog"""
+    cache.delete(f'catalog:{kind}:{catalog_version()}:{signature}')
+
+
+def get_product(product_id):
+    """Active product by id with its seller (the detail page shows it), or ``None``"""
+    return _read_through(
+        'product',
+        f'catalog:product:{product_id}',
+        lambda: Product.objects.select_related('seller').filter(id=product_id, is_active=True).first(),
+    )
+
+
+def invalidate_products(product_ids):
+    cache.delete_many([f'catalog:product:{product_id}' for product_id in product_ids])
+    bump_catalog_version()
+
+
+def get_stats():
+    stats = {}
+    for kind in KINDS:
+        hits = cache.get(STATS_KEY.format(kind=kind, outcome='hits'), 0)
+        misses = cache.get(STATS_KEY.format(kind=kind, outcome='misses'), 0)
+        stats[kind] = {'hits': hits, 'misses': misses}
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([
+        STATS_KEY.format(kind=kind, outcome=outcome)
+        for kind in KINDS
+        for outcome in ('hits', 'misses')
+    ])
@@ -0,0 +1,73 @@
+"""
+CSV export of a seller's orders.
+
+One row per order item, with the order's columns repeated. Rows come from
+a single joined query read with ``.iterator()``, so only ``CHUNK_SIZE`` rows
+are held at a time (on PostgreSQL through a server-side cursor). The CSV
+lines are yielded as they are written, which keeps memory flat however
+many orders are exported.
+
+Text cells come from buyers (addresses, names), so any that a spreadsheet
+would read as a formula is prefixed with a quote.
+"""
+import csv
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import OrderItem
+
+CHUNK_SIZE = 2000
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+COLUMNS = [
+    ('order_number', 'order__order_number'),
+    ('created_at', 'order__created_at'),
+    ('status', 'order__status'),
+    ('payment_status', 'order__payment_status'),
+    ('customer', 'order__customer__username'),
+    ('customer_phone', 'order__customer_phone'),
+    ('shipping_address', 'order__shipping_address'),
+    ('order_total', 'order__total_amount'),
+    ('product_id', 'product_id'),
+    ('product', 'product__name'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'price'),
+]
+
+
+def safe_cell(value):
+    """``value`` with a leading quote if Excel or Sheets would run it as a formula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Echo:
+    """File-like object whose write() hands the line back instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def order_items(seller, status=None, since=None, until=None):
+    """The seller's order items, oldest order first; ``since``/``until`` are inclusive days"""
+    items = OrderItem.objects.filter(order__seller=seller)
+    if status:
+        items = items.filter(order__status=status)
+    if since:
+        items = items.filter(order__created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+    if until:
+        items = items.filter(order__created_at__lt=timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min)))
+    # values_list joins order, customer and product like select_related would,
+    # without building model instances for every row
+    return items.order_by('order__created_at', 'order_id', 'id').values_list(*(field for _, field in COLUMNS))
+
+
+def csv_lines(items, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in COLUMNS])
+    for row in items.iterator(chunk_size=chunk_size):
+        row = [safe_cell(value) for value in row]
+        row[1] = timezone.localtime(row[1]).isoformat()
+        yield writer.writerow(row)
@@ -1,9 +1,10 @@
 from django import forms
 from .models import Product
+from project.uploads import BoundedImageField
 
 class ProductForm(forms.ModelForm):
     # Make image field required
-    image = forms.ImageField(
+    image = BoundedImageField(
         required=True,
         widget=forms.ClearableFileInput(attrs={
             'class': 'block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-blue-50 file:text-blue-700 hover:file:bg-blue-100',
@@ -0,0 +1,151 @@
+"""
+Stock levels and reservations.
+
+Card orders do not take stock when they are placed; ``reserve`` holds the
+units in ``StockReservation`` for ``STOCK_RESERVATION_TTL`` instead, and
+``convert_reservations`` turns the holds into a real decrement once the
+payment succeeds. Stock available to sell is ``stock_quantity`` minus the
+unexpired holds, summed per product over the (product, expires_at) index.
+Expired holds are deleted in bulk by a periodic background sweep, which
+also cancels the orders that were never paid.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import cache as catalog_cache
+from .models import Order, OrderItem, Product, StockReservation
+
+DEFAULT_RESERVATION_TTL = 30 * 60
+
+
+class OutOfStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        if products:
+            names = ', '.join(f"{product.name} (only {product.available} left)" for product in products)
+            super().__init__(f"Not enough stock for {names}.")
+        else:
+            super().__init__("Some items just sold out. Please review your cart.")
+
+
+def held_quantity(product=OuterRef('pk')):
+    """Units of ``product`` held by unexpired reservations, as a subquery expression"""
+    holds = (
+        StockReservation.objects.filter(product=product, expires_at__gt=timezone.now())
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(holds[:1]), 0)
+
+
+def with_available(products):
+    """Annotate a Product queryset with ``available``: stock minus active holds"""
+    return products.annotate(available=F('stock_quantity') - held_quantity())
+
+
+def short_products(quantities):
+    """Products in {product_id: quantity} that cannot currently be sold in that amount"""
+    products = with_available(Product.objects.filter(pk__in=quantities).only('name', 'stock_quantity'))
+    return [product for product in products if product.available < quantities[product.pk]]
+
+
+def take_stock(quantities):
+    """
+    Decrement stock for {product_id: quantity} in one statement, all or nothing.
+
+    Units held for other orders are not for sale, so a product only matches
+    when its stock covers both the holds and the quantity. Returns False
+    when any product is short; the caller must then roll back.
+    """
+    condition = Q()
+    for product_id, quantity in quantities.items():
+        condition |= Q(pk=product_id, stock_quantity__gte=F('held') + quantity)
+    updated = (
+        Product.objects.alias(held=held_quantity())
+        .filter(condition)
+        .update(
+            stock_quantity=F('stock_quantity') - Case(
+                *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                default=Value(0),
+            )
+        )
+    )
+    # Stock changed through update(), so no post_save reaches the catalog cache
+    transaction.on_commit(lambda: catalog_cache.invalidate_products(list(quantities)))
+    return updated == len(quantities)
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', DEFAULT_RESERVATION_TTL))
+
+
+def reserve(order_items):
+    """Hold stock for OrderItems of unpaid orders; raises OutOfStock if any is short"""
+    quantities = defaultdict(int)
+    for item in order_items:
+        quantities[item.product_id] += item.quantity
+
+    with transaction.atomic():
+        # Lock the products so two checkouts cannot both claim the last units
+        products = with_available(Product.objects.select_for_update().filter(pk__in=quantities))
+        short = [product for product in products if product.available < quantities[product.pk]]
+        if short:
+            raise OutOfStock(short)
+        expires_at = timezone.now() + reservation_ttl()
+        StockReservation.objects.bulk_create([
+            StockReservation(order=item.order, product_id=item.product_id, quantity=item.quantity, expires_at=expires_at)
+            for item in order_items
+        ])
+
+
+def convert_reservations(order_ids):
+    """Take the stock for paid orders and drop their holds; raises OutOfStock"""
+    with transaction.atomic():
+        StockReservation.objects.filter(order_id__in=order_ids).delete()
+        quantities = dict(
+            OrderItem.objects.filter(order_id__in=order_ids)
+            .values('product_id')
+            .annotate(total=Sum('quantity'))
+            .values_list('product_id', 'total')
+        )
+        if quantities and not take_stock(quantities):
+            raise OutOfStock([])
+    return quantities
+
+
+def reservation_deadline(order_ids):
+    """When the earliest hold of these orders expires, or None when they hold nothing"""
+    return StockReservation.objects.filter(order_id__in=order_ids).aggregate(deadline=Min('expires_at'))['deadline']
+
+
+def extend_reservations(order_ids, expires_at):
+    """Keep the holds of these orders until at least ``expires_at``"""
+    return StockReservation.objects.filter(order_id__in=order_ids, expires_at__lt=expires_at).update(expires_at=expires_at)
+
+
+def release_reservations(order_ids):
+    return StockReservation.objects.filter(order_id__in=order_ids).delete()[0]
+
+
+def release_expired():
+    """Delete expired holds and cancel the unpaid orders they belonged to, failing their payment"""
+    now = timezone.now()
+    with transaction.atomic():
+        expired = StockReservation.objects.filter(expires_at__lte=now)
+        order_ids = set(expired.values_list('order_id', flat=True))
+        released = expired.delete()[0]
+        # The payment session expires with the hold, so these can no longer be paid
+        cancelled = (
+            Order.objects.filter(id__in=order_ids, status='pending', payment_status='pending')
+            .exclude(reservations__expires_at__gt=now)
+            .update(status='cancelled', payment_status='failed', updated_at=now)
+        )
+    return released, cancelled
@@ -0,0 +1,49 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from shop.models import Order, RollupWatermark
+from shop.sales import SELLER_SALES_WATERMARK, rebuild_seller_sales
+
+
+class Command(BaseCommand):
+    help = "Rebuild the seller sales rollup from historical orders, a chunk of days at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat,
+                            help="First day to rebuild (YYYY-MM-DD); defaults to the first order")
+        parser.add_argument('--until', type=date.fromisoformat,
+                            help="Last day to rebuild (YYYY-MM-DD); defaults to today")
+        parser.add_argument('--chunk-days', type=int, default=30,
+                            help="Days recomputed per transaction")
+
+    def handle(self, *args, **options):
+        if options['chunk_days'] < 1:
+            raise CommandError("--chunk-days must be at least 1")
+        started_at = timezone.now()
+        first_order = Order.objects.aggregate(first=Min('created_at'))['first']
+        if first_order is None and options['since'] is None:
+            self.stdout.write("No orders to roll up")
+            return
+        first_day = options['since'] or timezone.localdate(first_order)
+        last_day = options['until'] or timezone.localdate()
+        if first_day > last_day:
+            raise CommandError("--since is after --until")
+
+        written = 0
+        chunk_start = first_day
+        while chunk_start <= last_day:
+            chunk_end = min(chunk_start + timedelta(days=options['chunk_days'] - 1), last_day)
+            began = time.perf_counter()
+            rows = rebuild_seller_sales(chunk_start, chunk_end)
+            written += rows
+            self.stdout.write(f"{chunk_start} to {chunk_end}: {rows} rows in {time.perf_counter() - began:.2f}s")
+            chunk_start = chunk_end + timedelta(days=1)
+
+        # Orders changed while the backfill ran are picked up by the next incremental run
+        if not RollupWatermark.objects.filter(name=SELLER_SALES_WATERMARK).exists():
+            RollupWatermark.objects.create(name=SELLER_SALES_WATERMARK, processed_until=started_at)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} seller sales rows"))
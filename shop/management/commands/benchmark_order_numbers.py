@@ -0,0 +1,72 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from shop.models import OrderNumberSequence
+from shop.order_numbers import BlockSequenceGenerator
+
+SEQUENCE_NAME = 'order_number_benchmark'
+
+
+class Rollback(Exception):
+    pass
+
+
+def generate(count, block_size, rollback_every):
+    """Numbers from one process; every ``rollback_every``-th one is taken in a rolled back transaction"""
+    generator = BlockSequenceGenerator(block_size)
+    generator.sequence_name = SEQUENCE_NAME
+    numbers = []
+    for index in range(count):
+        if rollback_every and index % rollback_every == 0:
+            try:
+                with transaction.atomic():
+                    generator()
+                    raise Rollback()
+            except Rollback:
+                # Like a failed checkout: the number was never stored
+                continue
+        numbers.append(generator())
+    connections.close_all()
+    return numbers
+
+
+class Command(BaseCommand):
+    help = "Generate order numbers from several processes at once and check that none collide"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--count', type=int, default=500_000, help="Numbers per process")
+        parser.add_argument('--block-size', type=int, default=1000)
+        parser.add_argument('--rollback-every', type=int, default=997,
+                            help="Take every Nth number inside a rolled back transaction (0 = never)")
+
+    def handle(self, *args, **options):
+        OrderNumberSequence.objects.filter(name=SEQUENCE_NAME).delete()
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        started = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(options['processes'], mp_context=multiprocessing.get_context('fork')) as pool:
+                futures = [
+                    pool.submit(generate, options['count'], options['block_size'], options['rollback_every'])
+                    for _ in range(options['processes'])
+                ]
+                results = [future.result() for future in futures]
+        finally:
+            OrderNumberSequence.objects.filter(name=SEQUENCE_NAME).delete()
+        elapsed = time.perf_counter() - started
+
+        total = sum(len(numbers) for numbers in results)
+        unique = len(set().union(*results))
+        ordered = all(numbers == sorted(numbers) for numbers in results)
+        longest = max(len(number) for numbers in results for number in numbers)
+        self.stdout.write(f"{total} numbers from {len(results)} processes in {elapsed:.1f}s "
+                          f"({total / elapsed:,.0f}/s), {unique} unique, longest {longest} chars, "
+                          f"{'increasing' if ordered else 'NOT increasing'} within each process")
+        if unique != total or not ordered:
+            raise CommandError("Order numbers collided or went backwards")
+        self.stdout.write(self.style.SUCCESS("No collisions"))
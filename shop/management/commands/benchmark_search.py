@@ -0,0 +1,75 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.models import Product
+from shop.search import LikeSearchBackend, SQLiteFTSBackend
+
+WORDS = [
+    'running', 'shoe', 'football', 'cricket', 'bat', 'tennis', 'racket', 'yoga',
+    'mat', 'cycling', 'helmet', 'gloves', 'jersey', 'training', 'dumbbell',
+    'kettlebell', 'swimming', 'goggles', 'hiking', 'backpack', 'bottle',
+    'carbon', 'leather', 'pro', 'lite', 'classic', 'junior', 'elite',
+]
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 and LIKE product search latency (seeded data is rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Synthetic products to add for the run")
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--query', action='append', dest='queries')
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or ['shoe', 'tennis rack', 'pro glo', 'yoga mat']
+        backends = [LikeSearchBackend(), SQLiteFTSBackend()]
+        backends = [backend for backend in backends if backend.is_available()]
+
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+                for backend in backends:
+                    backend.rebuild()
+
+            self.stdout.write(f"{Product.objects.filter(is_active=True).count()} active products")
+            for query in queries:
+                for backend in backends:
+                    timings = []
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        hits = backend.search(query)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    timings.sort()
+                    p95 = timings[int(len(timings) * 0.95) - 1]
+                    self.stdout.write(
+                        f"{query!r:>16} {type(backend).__name__:>20}: "
+                        f"{len(hits):>4} hits, mean {statistics.mean(timings):8.2f}ms, p95 {p95:8.2f}ms"
+                    )
+
+            # Never keep the synthetic catalog or the index rows built for it
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        seller = get_user_model().objects.create(
+            username=f'search-benchmark-{random.randrange(10**9)}', role='seller'
+        )
+        batch = []
+        for i in range(count):
+            batch.append(Product(
+                name=' '.join(random.choices(WORDS, k=3)),
+                description=' '.join(random.choices(WORDS, k=25)),
+                price=random.randint(1, 500),
+                image='products/benchmark.png',
+                seller=seller,
+                stock_quantity=random.randint(0, 50),
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
@@ -0,0 +1,66 @@
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from shop.suggest import PrefixIndex
+
+from .benchmark_search import WORDS
+
+
+class Command(BaseCommand):
+    help = "Measure suggestion latency and memory of the prefix index on synthetic names"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--lookups', type=int, default=10_000)
+        parser.add_argument('--limit', type=int, default=8)
+
+    def handle(self, *args, **options):
+        count = options['products']
+        names = [' '.join(random.choices(WORDS, k=random.randint(2, 5))) for _ in range(count)]
+
+        index = PrefixIndex(max_entries=count * 4)
+        tracemalloc.start()
+        started = time.perf_counter()
+        index.build(enumerate(names, start=1))
+        build_seconds = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        prefixes = [random.choice(WORDS)[:random.randint(1, 6)] for _ in range(options['lookups'])]
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.suggest(prefix, options['limit'])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        self.stdout.write(f"{count} products, {len(index)} keys, built in {build_seconds:.2f}s, "
+                          f"{memory / 1024 / 1024:.1f} MiB")
+        self.stdout.write(f"lookup mean {statistics.mean(timings):.4f}ms, "
+                          f"p99 {timings[int(len(timings) * 0.99) - 1]:.4f}ms, "
+                          f"max {timings[-1]:.4f}ms")
+
+        updates = min(1000, count)
+        started = time.perf_counter()
+        for product_id in range(1, updates + 1):
+            index.add(product_id, names[-product_id])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"incremental update {elapsed * 1000 / updates:.4f}ms per product")
+
+        # A stale index is rebuilt in a background thread while lookups keep using the old one
+        rebuild = threading.Thread(target=index.build, args=(enumerate(names, start=1),))
+        timings = []
+        rebuild.start()
+        while rebuild.is_alive():
+            started = time.perf_counter()
+            index.suggest(random.choice(prefixes), options['limit'])
+            timings.append((time.perf_counter() - started) * 1000)
+        rebuild.join()
+        timings.sort()
+        self.stdout.write(f"{len(timings)} lookups during a rebuild, "
+                          f"p99 {timings[int(len(timings) * 0.99) - 1]:.4f}ms, max {timings[-1]:.4f}ms")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shop import cache as catalog_cache
+
+
+class Command(BaseCommand):
+    help = "Show catalog cache hit/miss counters (only meaningful with a shared cache backend)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters afterwards")
+
+    def handle(self, *args, **options):
+        for kind, counts in catalog_cache.get_stats().items():
+            total = counts['hits'] + counts['misses']
+            ratio = counts['hits'] / total * 100 if total else 0
+            self.stdout.write(f"{kind:>10}: {counts['hits']:>8} hits {counts['misses']:>8} misses ({ratio:.1f}% hit rate)")
+        if options['reset']:
+            catalog_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from project.thumbnails import create_renditions
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate missing image renditions for existing products and profile pictures"
+
+    def handle(self, *args, **options):
+        names = set(Product.objects.exclude(image='').values_list('image', flat=True))
+        names |= set(
+            get_user_model().objects.exclude(profile_pic='').exclude(profile_pic__isnull=True)
+            .values_list('profile_pic', flat=True)
+        )
+        created = 0
+        for name in sorted(names):
+            if not default_storage.exists(name):
+                self.stderr.write(f"Missing original: {name}")
+                continue
+            created += create_renditions(default_storage, name)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} renditions for {len(names)} images"))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:08
+
+import shop.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_images(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    MediaBlob = apps.get_model('shop', 'MediaBlob')
+    rows = Product.objects.exclude(image='').values('image').annotate(refs=Count('id'))
+    MediaBlob.objects.bulk_create([MediaBlob(name=row['image'], refs=row['refs']) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_best_sellers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(storage=shop.storage.product_image_storage, upload_to='products/'),
+        ),
+        migrations.RunPython(count_existing_images, migrations.RunPython.noop),
+    ]
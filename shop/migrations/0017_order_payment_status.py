@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_order_number_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_status',
+            field=models.CharField(choices=[('unpaid', 'Unpaid'), ('pending', 'Awaiting payment'), ('paid', 'Paid'), ('failed', 'Payment failed')], default='unpaid', max_length=10),
+        ),
+    ]
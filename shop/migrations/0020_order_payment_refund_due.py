@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_seller_sales_day'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='payment_status',
+            field=models.CharField(choices=[('unpaid', 'Unpaid'), ('pending', 'Awaiting payment'), ('paid', 'Paid'), ('failed', 'Payment failed'), ('refund_due', 'Refund due')], default='unpaid', max_length=10),
+        ),
+    ]
@@ -1,24 +1,50 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 
+from .storage import product_image_storage
+
 User = get_user_model()
 
 class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    image = models.ImageField(upload_to='products/')
+    image = models.ImageField(upload_to='products/', storage=product_image_storage)
     seller = models.ForeignKey(User, on_delete=models.CASCADE)
     stock_quantity = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination of the buyer catalog and seller listings
+            models.Index(fields=['is_active', '-created_at', '-id'], name='product_active_newest_idx'),
+            models.Index(fields=['seller', '-created_at', '-id'], name='product_seller_newest_idx'),
+            models.Index(fields=['is_active', 'price', 'id'], name='product_active_price_idx'),
+        ]
+    
     def __str__(self):
         return self.name
     
     def is_in_stock(self):
         return self.stock_quantity > 0
 
+class CheckoutSession(models.Model):
+    """One checkout by a customer; its orders (one per seller) point back here"""
+    PAYMENT_METHOD_CHOICES = [
+        ('cod', 'Cash on Delivery'),
+        ('stripe', 'Card (Stripe)'),
+    ]
+    
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='checkouts')
+    payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Checkout {self.pk} by {self.customer_id}"
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', '🟡 Pending'),
@@ -32,6 +58,16 @@ class Order(models.Model):
     # Status progression for the timeline
     STATUS_PROGRESSION = ['pending', 'confirmed', 'shipped', 'delivered']
     
+    # Last known payment state, kept up to date by webhooks and background checks
+    PAYMENT_STATUS_CHOICES = [
+        ('unpaid', 'Unpaid'),
+        ('pending', 'Awaiting payment'),
+        ('paid', 'Paid'),
+        ('failed', 'Payment failed'),
+        # Paid after the order was cancelled; the charge must be refunded
+        ('refund_due', 'Refund due'),
+    ]
+    
     
     order_number = models.CharField(max_length=20, unique=True)
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
@@ -40,7 +76,11 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     shipping_address = models.TextField()
     customer_phone = models.CharField(max_length=15)
-    stripe_session_id = models.CharField(max_length=255, blank=True, null=True)  # Add this field
+    stripe_session_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)  # Add this field
+    payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='unpaid')
+    checkout = models.ForeignKey(
+        CheckoutSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -62,9 +102,16 @@ class Order(models.Model):
         """Check if order status can be updated"""
         return self.status not in ['delivered', 'cancelled']
     
+    def checkout_orders(self):
+        """All orders placed in the same checkout as this one"""
+        if self.checkout_id is None:
+            # Placed before checkouts were recorded
+            return Order.objects.filter(pk=self.pk)
+        return Order.objects.filter(checkout_id=self.checkout_id)
+    
     def get_next_status(self):
         """Get the next logical status in progression"""
-        if self.status == 'pending':
+        if self.status in ('pending', 'paid'):
             return 'confirmed'
         elif self.status == 'confirmed':
             return 'shipped'
@@ -72,13 +119,24 @@ class Order(models.Model):
             return 'delivered'
         return None
     
+    @staticmethod
+    def generate_order_number():
+        from .order_numbers import get_order_number_generator
+        return get_order_number_generator()()
+    
     def save(self, *args, **kwargs):
         if not self.order_number:
-            import random
-            import string
-            self.order_number = 'ORD' + ''.join(random.choices(string.digits, k=7))
+            self.order_number = self.generate_order_number()
         super().save(*args, **kwargs)
 
+class OrderNumberSequence(models.Model):
+    """Next unallocated value of a counter handed out in blocks, see shop.order_numbers"""
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField()
+    
+    def __str__(self):
+        return f"{self.name} @ {self.next_value}"
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE,related_name='order_items')
@@ -89,4 +147,140 @@ class OrderItem(models.Model):
         return f"{self.quantity} x {self.product.name}"
     
     def item_total(self):
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price
+
+class StockReservation(models.Model):
+    """Units held for an unpaid order until ``expires_at``, see shop.inventory"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # Active holds per product are summed on every stock check
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_expiry'),
+            models.Index(fields=['expires_at'], name='reservation_expiry'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for order {self.order_id} until {self.expires_at}"
+
+class ProductSalesDay(models.Model):
+    """Units of a product sold on one day, rolled up from OrderItem by shop.sales"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_days')
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_product_sales_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'product'], name='sales_day_product_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product} on {self.day}: {self.units}"
+
+class SellerSalesDay(models.Model):
+    """A seller's sales of one product on one day, rolled up from OrderItem by shop.sales"""
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sales_days')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='seller_sales_days')
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'product', 'day'], name='unique_seller_sales_day'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'day'], name='seller_sales_day_idx'),
+            models.Index(fields=['day', 'product'], name='seller_sales_product_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product} on {self.day}: {self.units} for {self.revenue}"
+
+class SellerOrdersDay(models.Model):
+    """Distinct orders a seller received on one day, rolled up alongside SellerSalesDay"""
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_days')
+    day = models.DateField()
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'day'], name='unique_seller_orders_day'),
+        ]
+    
+    def __str__(self):
+        return f"{self.seller} on {self.day}: {self.orders} orders"
+
+class BestSeller(models.Model):
+    """Materialized best-seller ranking for a trailing window of days"""
+    window_days = models.PositiveSmallIntegerField()
+    rank = models.PositiveSmallIntegerField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='best_seller_ranks')
+    units = models.PositiveIntegerField()
+    
+    class Meta:
+        ordering = ['window_days', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['window_days', 'rank'], name='unique_best_seller_rank'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.rank} over {self.window_days} days: {self.product}"
+
+class RollupWatermark(models.Model):
+    """How far a background rollup has processed Order.updated_at"""
+    name = models.CharField(max_length=50, primary_key=True)
+    processed_until = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.name} @ {self.processed_until}"
+
+
+class MediaBlob(models.Model):
+    """Reference count for a content-addressed file, see shop.storage"""
+    name = models.CharField(max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
+    
+    @classmethod
+    def acquire(cls, name):
+        """Add a reference, locking the row until the caller's transaction ends"""
+        with transaction.atomic():
+            # The UPDATE holds the row lock until the surrounding transaction ends
+            if cls.objects.filter(name=name).update(refs=F('refs') + 1):
+                return
+            try:
+                with transaction.atomic():
+                    cls.objects.create(name=name, refs=1)
+            except IntegrityError:
+                # Created by someone else in the meantime
+                cls.objects.filter(name=name).update(refs=F('refs') + 1)
+    
+    @classmethod
+    def release(cls, name, delete_file):
+        """
+        Drop one reference. When it was the last, ``delete_file(name)`` runs
+        while the row is still locked, so no acquire can slip in between the
+        check and the deletion. Returns True when the file was deleted.
+        """
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return False
+            if blob.refs > 1:
+                cls.objects.filter(name=name).update(refs=F('refs') - 1)
+                return False
+            delete_file(name)
+            blob.delete()
+            return True
@@ -0,0 +1,113 @@
+"""
+Order number generators.
+
+``BlockSequenceGenerator`` builds numbers as ``ORD`` + ``YYMMDD`` + a
+10-digit sequence value. The sequence comes from ``OrderNumberSequence``,
+but a process only touches that row once per ``ORDER_NUMBER_BLOCK_SIZE``
+orders: it reserves a block of values with a single atomic increment and
+hands them out from memory. Values are never reused, so numbers cannot
+collide and inserting an order needs no uniqueness check beforehand; as
+the sequence only grows, new orders land at the end of the order_number
+index instead of all over it.
+
+A block reserved inside a transaction is only kept once that transaction
+commits, through a ``transaction.on_commit`` callback. Until then it serves
+just the number it was reserved for: if the transaction (or a savepoint
+around the reservation) rolls back, the increment is undone and another
+process may be handed the same values, so nothing else may come from it.
+"""
+import os
+import random
+import string
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OrderNumberSequence
+
+DEFAULT_BLOCK_SIZE = 100
+
+
+class RandomOrderNumberGenerator:
+    """The original scheme: ORD + 7 random digits. Collides at volume."""
+
+    def __call__(self):
+        return 'ORD' + ''.join(random.choices(string.digits, k=7))
+
+
+class SequenceBlock:
+    def __init__(self, start, end):
+        self.next = start
+        self.end = end
+        self.pid = os.getpid()
+
+    def usable(self):
+        if self.pid != os.getpid():
+            # Forked after reserving; the parent still owns these values
+            return False
+        return self.next < self.end
+
+    def take(self):
+        value = self.next
+        self.next += 1
+        return value
+
+
+class BlockSequenceGenerator:
+    prefix = 'ORD'
+    date_format = '%y%m%d'
+    digits = 10
+    sequence_name = 'order_number'
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+        # Blocks reserved in a transaction belong to that thread's connection
+        self._local = threading.local()
+
+    def __call__(self):
+        value = self.next_value()
+        return f"{self.prefix}{timezone.now():{self.date_format}}{value:0{self.digits}d}"
+
+    def next_value(self):
+        block = getattr(self._local, 'block', None)
+        if block is None or not block.usable():
+            block = SequenceBlock(*self.reserve_block())
+            if connection.in_atomic_block:
+                # Only reuse the rest of the block once the reservation is committed
+                transaction.on_commit(lambda: self.keep(block))
+            else:
+                self.keep(block)
+        return block.take()
+
+    def keep(self, block):
+        self._local.block = block
+
+    def reserve_block(self):
+        """Atomically claim the next ``block_size`` values as [start, end)"""
+        sequences = OrderNumberSequence.objects.filter(name=self.sequence_name)
+        with transaction.atomic():
+            if not sequences.update(next_value=F('next_value') + self.block_size):
+                try:
+                    with transaction.atomic():
+                        OrderNumberSequence.objects.create(name=self.sequence_name, next_value=1 + self.block_size)
+                    return 1, 1 + self.block_size
+                except IntegrityError:
+                    # Another process created the row first
+                    sequences.update(next_value=F('next_value') + self.block_size)
+            end = sequences.values_list('next_value', flat=True).get()
+        return end - self.block_size, end
+
+
+_generator = None
+
+
+def get_order_number_generator():
+    global _generator
+    if _generator is None:
+        path = getattr(settings, 'ORDER_NUMBER_GENERATOR', 'shop.order_numbers.BlockSequenceGenerator')
+        _generator = import_string(path)()
+    return _generator
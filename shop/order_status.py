@@ -0,0 +1,99 @@
+"""
+Bulk order status changes.
+
+A seller picks orders on the order list and either moves each one a step
+along ``Order.STATUS_PROGRESSION`` or cancels them. Every order is checked
+first, then the valid ones are written with one UPDATE per target status.
+Hundreds of shipments cost a handful of queries, not one save() each.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.utils import timezone
+
+from .background_tasks import schedule_best_seller_refresh
+from .inventory import release_reservations
+from .models import Order
+
+ADVANCE = 'advance'
+CANCELLED = 'cancelled'
+MAX_BULK_ORDERS = 500
+
+
+@dataclass
+class StatusChange:
+    order_id: int
+    order_number: str = None
+    old_status: str = None
+    new_status: str = None
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def target_status(order, action):
+    """The status ``action`` moves ``order`` to; raises ValueError when it is not allowed"""
+    next_status = order.get_next_status()
+    if action == ADVANCE:
+        if next_status is None:
+            raise ValueError(f"cannot move on from {order.status}")
+        return next_status
+    if action == CANCELLED:
+        if not order.can_update_status:
+            raise ValueError(f"cannot cancel a {order.status} order")
+        return CANCELLED
+    if action not in Order.STATUS_PROGRESSION:
+        raise ValueError(f"unknown status {action}")
+    if action != next_status:
+        raise ValueError(f"cannot go from {order.status} to {action}")
+    return action
+
+
+def change_order_statuses(seller, order_ids, action):
+    """
+    Apply ``action`` (ADVANCE, a status from the progression or CANCELLED) to
+    the seller's orders and return a StatusChange per requested id, in order.
+    """
+    changes = {order_id: StatusChange(order_id) for order_id in order_ids}
+    by_target = defaultdict(list)
+    with transaction.atomic():
+        orders = (
+            Order.objects.select_for_update()
+            .filter(seller=seller, id__in=changes)
+            .only('id', 'order_number', 'status')
+        )
+        for order in orders:
+            change = changes[order.id]
+            change.order_number, change.old_status = order.order_number, order.status
+            try:
+                change.new_status = target_status(order, action)
+            except ValueError as e:
+                change.error = str(e)
+            else:
+                by_target[change.new_status].append(change)
+
+        now = timezone.now()
+        for new_status, group in by_target.items():
+            # Guard on the checked status in case the row moved since it was read
+            matched = Order.objects.filter(
+                id__in=[change.order_id for change in group],
+                status__in={change.old_status for change in group},
+            ).update(status=new_status, updated_at=now)
+            if matched != len(group):
+                current = dict(Order.objects.filter(id__in=[c.order_id for c in group]).values_list('id', 'status'))
+                for change in group:
+                    if current.get(change.order_id) != new_status:
+                        change.error, change.new_status = "changed by someone else", None
+        cancelled = [change.order_id for change in by_target.get(CANCELLED, []) if change.ok]
+        if cancelled:
+            release_reservations(cancelled)
+        if by_target:
+            transaction.on_commit(schedule_best_seller_refresh)
+
+    for change in changes.values():
+        if change.order_number is None:
+            change.error = "order not found"
+    return list(changes.values())
@@ -0,0 +1,230 @@
+"""
+Sales rollups and the best-seller ranking built on them.
+
+``roll_up_sales`` folds orders that changed since the last run into
+``ProductSalesDay`` (units per product per day), recomputing only the
+(product, day) cells those orders touch. ``rank_best_sellers`` then ranks
+products over trailing windows from that small table and materializes the
+result in ``BestSeller``, which the buyer dashboard reads as a plain id list.
+
+``roll_up_seller_sales`` keeps ``SellerSalesDay`` (units, revenue and order
+count per seller, product and day) current the same way, under its own
+watermark, together with ``SellerOrdersDay`` (distinct orders per seller
+and day, which summing per-product rows would overcount).
+``seller_sales_series`` serves the seller dashboard's time series from
+those two tables alone. ``rebuild_seller_sales`` recomputes a range of days from
+scratch for the backfill command.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import cache as catalog_cache
+from .models import BestSeller, OrderItem, Product, ProductSalesDay, RollupWatermark, SellerOrdersDay, SellerSalesDay
+
+SALES_WATERMARK = 'product_sales_day'
+SELLER_SALES_WATERMARK = 'seller_sales_day'
+BEST_SELLER_WINDOWS = (7, 30)
+BEST_SELLER_COUNT = 24
+CENTS = Decimal('0.01')
+
+# Re-read a little before the watermark so orders committed late are not missed
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def _touched_cells(watermark_name):
+    """The (day -> product ids) cells touched by orders changed since the named watermark"""
+    watermark = RollupWatermark.objects.filter(name=watermark_name).first()
+    changed_items = OrderItem.objects.all()
+    if watermark is not None:
+        changed_items = changed_items.filter(
+            order__updated_at__gte=watermark.processed_until - WATERMARK_OVERLAP
+        )
+    touched = defaultdict(set)
+    for product_id, day in (
+        changed_items.annotate(day=TruncDate('order__created_at'))
+        .values_list('product_id', 'day')
+        .distinct()
+    ):
+        touched[day].add(product_id)
+    return touched
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _sold_items(start, end):
+    """Items of orders placed in [start, end) that still count as sales"""
+    return OrderItem.objects.filter(
+        order__created_at__gte=start, order__created_at__lt=end
+    ).exclude(order__status='cancelled')
+
+
+def roll_up_sales():
+    """Refresh ProductSalesDay for orders changed since the last run"""
+    started_at = timezone.now()
+    touched = _touched_cells(SALES_WATERMARK)
+
+    with transaction.atomic():
+        for day, product_ids in touched.items():
+            day_start = _day_start(day)
+            totals = (
+                _sold_items(day_start, day_start + timedelta(days=1))
+                .filter(product_id__in=product_ids)
+                .values('product_id')
+                .annotate(units=Sum('quantity'))
+            )
+            ProductSalesDay.objects.filter(day=day, product_id__in=product_ids).delete()
+            ProductSalesDay.objects.bulk_create([
+                ProductSalesDay(product_id=row['product_id'], day=day, units=row['units'])
+                for row in totals
+            ])
+        RollupWatermark.objects.update_or_create(
+            name=SALES_WATERMARK, defaults={'processed_until': started_at}
+        )
+    return sum(len(product_ids) for product_ids in touched.values())
+
+
+def _seller_sales_rows(items):
+    return (
+        items.annotate(day=TruncDate('order__created_at'))
+        .values('order__seller_id', 'product_id', 'day')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            orders=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+
+
+def _seller_sales_days(rows):
+    return [
+        SellerSalesDay(
+            seller_id=row['order__seller_id'],
+            product_id=row['product_id'],
+            day=row['day'],
+            units=row['units'],
+            revenue=row['revenue'],
+            orders=row['orders'],
+        )
+        for row in rows
+    ]
+
+
+def _seller_orders_days(items):
+    rows = (
+        items.annotate(day=TruncDate('order__created_at'))
+        .values('order__seller_id', 'day')
+        .annotate(orders=Count('order_id', distinct=True))
+        .order_by()
+    )
+    return [SellerOrdersDay(seller_id=row['order__seller_id'], day=row['day'], orders=row['orders']) for row in rows]
+
+
+def roll_up_seller_sales():
+    """Refresh SellerSalesDay and SellerOrdersDay for orders changed since the last run"""
+    started_at = timezone.now()
+    touched = _touched_cells(SELLER_SALES_WATERMARK)
+
+    with transaction.atomic():
+        for day, product_ids in touched.items():
+            day_start = _day_start(day)
+            items = _sold_items(day_start, day_start + timedelta(days=1))
+            rows = _seller_sales_rows(items.filter(product_id__in=product_ids))
+            SellerSalesDay.objects.filter(day=day, product_id__in=product_ids).delete()
+            SellerSalesDay.objects.bulk_create(_seller_sales_days(rows))
+            # Recount the whole day for the sellers of the touched products
+            seller_ids = set(Product.objects.filter(pk__in=product_ids).values_list('seller_id', flat=True))
+            SellerOrdersDay.objects.filter(day=day, seller_id__in=seller_ids).delete()
+            SellerOrdersDay.objects.bulk_create(_seller_orders_days(items.filter(order__seller_id__in=seller_ids)))
+        RollupWatermark.objects.update_or_create(
+            name=SELLER_SALES_WATERMARK, defaults={'processed_until': started_at}
+        )
+    return sum(len(product_ids) for product_ids in touched.values())
+
+
+def rebuild_seller_sales(first_day, last_day):
+    """Recompute the seller rollups from first_day to last_day inclusive; returns SellerSalesDay rows written"""
+    with transaction.atomic():
+        items = _sold_items(_day_start(first_day), _day_start(last_day + timedelta(days=1)))
+        SellerOrdersDay.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+        SellerOrdersDay.objects.bulk_create(_seller_orders_days(items))
+        SellerSalesDay.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+        return len(SellerSalesDay.objects.bulk_create(_seller_sales_days(_seller_sales_rows(items))))
+
+
+def seller_sales_series(seller, first_day, last_day, product_id=None):
+    """Daily units, revenue and order count for a seller, one entry per day including empty ones"""
+    days = SellerSalesDay.objects.filter(seller=seller, day__gte=first_day, day__lte=last_day)
+    if product_id is not None:
+        days = days.filter(product_id=product_id)
+    totals = {
+        row['day']: row
+        for row in days.values('day').annotate(
+            units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders')
+        ).order_by()
+    }
+    if product_id is None:
+        # An order with several products is in several rows, so take the
+        # seller's order count from its own rollup instead of summing them
+        order_counts = dict(
+            SellerOrdersDay.objects.filter(seller=seller, day__gte=first_day, day__lte=last_day)
+            .values_list('day', 'orders')
+        )
+        for day, row in totals.items():
+            row['orders'] = order_counts.get(day, 0)
+    series = []
+    day = first_day
+    while day <= last_day:
+        row = totals.get(day, {})
+        series.append({
+            'day': day,
+            'units': row.get('units') or 0,
+            'revenue': Decimal(row.get('revenue') or 0).quantize(CENTS),
+            'orders': row.get('orders') or 0,
+        })
+        day += timedelta(days=1)
+    return series
+
+
+def rank_best_sellers(windows=BEST_SELLER_WINDOWS, size=BEST_SELLER_COUNT):
+    """Rebuild the BestSeller ranking for each trailing window"""
+    today = timezone.now().date()
+    for window_days in windows:
+        rows = (
+            ProductSalesDay.objects.filter(
+                day__gt=today - timedelta(days=window_days),
+                product__is_active=True,
+            )
+            .values('product_id')
+            .annotate(total=Sum('units'))
+            .filter(total__gt=0)
+            .order_by('-total', 'product_id')[:size]
+        )
+        with transaction.atomic():
+            BestSeller.objects.filter(window_days=window_days).delete()
+            BestSeller.objects.bulk_create([
+                BestSeller(window_days=window_days, rank=rank, product_id=row['product_id'], units=row['total'])
+                for rank, row in enumerate(rows, start=1)
+            ])
+        catalog_cache.forget_list('bestsellers', window_days)
+
+
+def best_seller_ids(window_days=BEST_SELLER_WINDOWS[0]):
+    """Ranked product ids for a window, served from the catalog cache"""
+    return catalog_cache.get_list(
+        'bestsellers',
+        window_days,
+        lambda: list(
+            BestSeller.objects.filter(window_days=window_days)
+            .order_by('rank')
+            .values_list('product_id', flat=True)
+        ),
+    )
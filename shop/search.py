@@ -0,0 +1,156 @@
+"""
+Product search backends.
+
+The buyer catalog never queries ``Product`` with ``icontains`` directly any
+more; it asks the configured backend for a ranked list of product ids and
+fetches those rows. ``PRODUCT_SEARCH_BACKEND`` picks the backend, the
+default being the SQLite FTS5 index below. Backends that cannot run on the
+current database fall back to the plain LIKE scan.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+DEFAULT_RESULT_LIMIT = 200
+MAX_QUERY_TOKENS = 8
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    """Split a user query into lowercase word tokens"""
+    return TOKEN_RE.findall(query.lower())[:MAX_QUERY_TOKENS]
+
+
+class SearchBackend:
+    """Interface every product search backend implements"""
+
+    def is_available(self):
+        return True
+
+    def search(self, query, limit=DEFAULT_RESULT_LIMIT):
+        """Return ids of active products matching ``query``, best match first"""
+        raise NotImplementedError
+
+    def index_product(self, product):
+        """Add, refresh or drop (if inactive) a single product"""
+
+    def remove_product(self, product_id):
+        """Drop a product from the index"""
+
+    def rebuild(self, batch_size=1000):
+        """Re-index every active product, returning how many were indexed"""
+        return 0
+
+
+class LikeSearchBackend(SearchBackend):
+    """The original ``icontains`` scan, kept as a portable fallback"""
+
+    def search(self, query, limit=DEFAULT_RESULT_LIMIT):
+        query = query.strip()
+        if not query:
+            return []
+        return list(
+            Product.objects.filter(is_active=True)
+            .filter(Q(name__icontains=query) | Q(description__icontains=query))
+            .order_by('-created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Ranked search over an FTS5 virtual table holding active products.
+
+    The table is keyed by the product id (its ``rowid``) and created by
+    migration ``shop.0009``. Every query token is matched as a prefix and
+    results are ordered by bm25, with hits in the name weighted above hits
+    in the description.
+    """
+
+    table = 'shop_product_fts'
+    name_weight = 10.0
+    description_weight = 1.0
+
+    def is_available(self):
+        return connection.vendor == 'sqlite'
+
+    def build_match(self, query):
+        # Quote every token so FTS5 operators typed by the user are literal
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, query, limit=DEFAULT_RESULT_LIMIT):
+        match = self.build_match(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, %s, %s) LIMIT %s",
+                [match, self.name_weight, self.description_weight, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_product(self, product):
+        if not product.is_active:
+            self.remove_product(product.pk)
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {self.table} (rowid, name, description) "
+                f"VALUES (%s, %s, %s)",
+                [product.pk, product.name, product.description],
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def rebuild(self, batch_size=1000):
+        rows = (
+            Product.objects.filter(is_active=True)
+            .order_by('id')
+            .values_list('id', 'name', 'description')
+            .iterator(chunk_size=batch_size)
+        )
+        indexed = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    indexed += self._insert_batch(cursor, batch)
+                    batch = []
+            if batch:
+                indexed += self._insert_batch(cursor, batch)
+            # Merge the b-tree segments written above into one
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+        return indexed
+
+    def _insert_batch(self, cursor, batch):
+        cursor.executemany(
+            f"INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)",
+            batch,
+        )
+        return len(batch)
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured backend, falling back to LIKE where unsupported"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'shop.search.SQLiteFTSBackend')
+        backend = import_string(path)()
+        if not backend.is_available():
+            backend = LikeSearchBackend()
+        _backend = backend
+    return _backend
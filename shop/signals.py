@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from project.thumbnails import delete_renditions, queue_renditions
+
+from . import cache as catalog_cache
+from . import suggest
+from .models import MediaBlob, Product
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, **kwargs):
+    # Index after commit so a rolled back save never reaches the search index
+    def update_indexes():
+        get_search_backend().index_product(instance)
+        suggest.update_product(instance)
+        catalog_cache.invalidate_products([instance.pk])
+    transaction.on_commit(update_indexes)
+
+
+@receiver(post_save, sender=Product)
+def generate_product_image_renditions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: queue_renditions(instance.image))
+
+
+def _delete_image(name):
+    Product._meta.get_field('image').storage.delete(name)
+    delete_renditions(name)
+
+
+def release_image(name):
+    """Drop a reference to a stored image, deleting it once unused"""
+    if name:
+        MediaBlob.release(name, _delete_image)
+
+
+@receiver(post_init, sender=Product)
+def remember_image_name(sender, instance, **kwargs):
+    # Read the raw value so deferred loads don't trigger a query; None = unknown
+    value = instance.__dict__.get('image')
+    instance._stored_image_name = getattr(value, 'name', value)
+
+
+@receiver(pre_save, sender=Product)
+def note_image_upload(sender, instance, **kwargs):
+    # Runs before the file is stored; an upload takes its reference in the storage
+    instance._image_uploaded = bool(instance.image) and not instance.image._committed
+
+
+@receiver(post_save, sender=Product)
+def track_image_references(sender, instance, **kwargs):
+    # A new product had no stored image, whatever it was constructed with
+    old_name = None if kwargs['created'] else instance._stored_image_name
+    new_name = instance.image.name
+    uploaded = getattr(instance, '_image_uploaded', False)
+    instance._image_uploaded = False
+    if not uploaded and old_name == new_name:
+        return
+    if old_name is None and not kwargs['created']:
+        # Previous image unknown (deferred load); keep what the storage counted
+        instance._stored_image_name = new_name
+        return
+    instance._stored_image_name = new_name
+
+    if new_name and not uploaded:
+        # Assigned by name: take the reference here, inside the saving transaction
+        MediaBlob.acquire(new_name)
+    if old_name:
+        # Re-uploading the same file counted it twice, so this never deletes it
+        transaction.on_commit(lambda: release_image(old_name))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    product_id = instance.pk
+
+    image_name = instance._stored_image_name
+
+    def update_indexes():
+        get_search_backend().remove_product(product_id)
+        suggest.remove_product(product_id)
+        catalog_cache.invalidate_products([product_id])
+        release_image(image_name)
+    transaction.on_commit(update_indexes)
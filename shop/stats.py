@@ -0,0 +1,41 @@
+"""
+Seller dashboard figures.
+
+Each page reads its counts in a single query. The order list uses one
+conditional aggregation over the seller's orders (a ``COUNT ... FILTER``
+per status), and the dashboard folds its product and order counts into
+scalar subqueries on the seller's own row. Both go through the seller
+index on their tables, so no per-seller counter table is needed.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Order, Product, User
+
+
+def order_status_counts(seller):
+    """``{'total': n, <status>: n, ...}`` for every status in Order.STATUS_CHOICES"""
+    return Order.objects.filter(seller=seller).aggregate(
+        total=Count('pk'),
+        **{status: Count('pk', filter=Q(status=status)) for status, _ in Order.STATUS_CHOICES},
+    )
+
+
+def _count(queryset):
+    counts = queryset.filter(seller=OuterRef('pk')).order_by().values('seller').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def dashboard_counts(seller):
+    """Product and order counts for the seller dashboard"""
+    return (
+        User.objects.filter(pk=seller.pk)
+        .annotate(
+            total_products=_count(Product.objects.all()),
+            active_products=_count(Product.objects.filter(is_active=True)),
+            total_orders=_count(Order.objects.all()),
+            pending_orders=_count(Order.objects.filter(status='pending')),
+        )
+        .values('total_products', 'active_products', 'total_orders', 'pending_orders')
+        .get()
+    )
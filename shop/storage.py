@@ -0,0 +1,72 @@
+"""
+Content-addressed storage for product images.
+
+Uploads are hashed while they are streamed to a temporary file and then
+moved to ``<upload_to>/<aa>/<sha256><ext>``, so re-uploading the same
+screenshot reuses the file already on disk instead of writing a copy with
+a random suffix. ``MediaBlob`` keeps a reference count per stored file.
+Saving an upload takes its reference here, under the MediaBlob row lock
+and before checking whether the file is already on disk; a release that
+drops the last reference deletes the file under the same lock. So a file
+that is being reused can never be deleted in between. The Product signals
+release references, and the file (with its renditions) is deleted once
+nothing points at it.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+INCOMING_DIR = '.incoming'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is the digest of the content, chosen in _save()
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+
+        incoming = os.path.join(self.location, INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            hexdigest = digest.hexdigest()
+            final_name = posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+            final_path = self.path(final_name)
+            with transaction.atomic():
+                MediaBlob.acquire(final_name)
+                if os.path.exists(final_path):
+                    os.remove(temp_path)
+                else:
+                    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(temp_path, self.file_permissions_mode)
+                    os.replace(temp_path, final_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return final_name
+
+
+def product_image_storage():
+    return ContentAddressedStorage()
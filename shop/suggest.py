@@ -0,0 +1,175 @@
+"""
+In-process prefix index for search-as-you-type suggestions.
+
+Active product names are kept as a sorted list of ``(key, product_id)``
+pairs, one key per word of the name (so "Pro Tennis Racket" is found by
+"pro", "ten" and "rac"). A lookup is a single ``bisect`` followed by a
+short forward scan. The index is built lazily on first use, refreshed after
+``SUGGEST_INDEX_TTL`` seconds so workers pick up changes made elsewhere,
+and patched in place from the Product signals in between. Only the first
+build makes a request wait; a refresh runs in a background thread while
+the stale index keeps answering.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from heapq import merge
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Product
+
+MAX_KEY_LENGTH = 48
+MAX_NAME_LENGTH = 100
+MAX_KEYS_PER_PRODUCT = 4
+DEFAULT_MAX_ENTRIES = 400_000
+DEFAULT_TTL = 300
+# One sort() holds the GIL throughout, so a rebuild sorts in runs this long
+SORT_RUN = 10_000
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def keys_for(name):
+    """Index keys for a product name: the name from each word onwards"""
+    words = normalize(name).split(' ')
+    keys = []
+    for position in range(min(len(words), MAX_KEYS_PER_PRODUCT)):
+        key = ' '.join(words[position:])[:MAX_KEY_LENGTH]
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+class PrefixIndex:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.built_at = None
+        self._entries = []
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, rows):
+        """Replace the index with ``rows`` of ``(product_id, name)``, newest first"""
+        entries = []
+        names = {}
+        for product_id, name in rows:
+            name = name[:MAX_NAME_LENGTH]
+            keys = keys_for(name)
+            if len(entries) + len(keys) > self.max_entries:
+                break
+            names[product_id] = name
+            entries.extend((key, product_id) for key in keys)
+        # Merging sorted runs lets lookups on other threads in between
+        runs = [sorted(entries[start:start + SORT_RUN]) for start in range(0, len(entries), SORT_RUN)]
+        entries = list(merge(*runs))
+        with self._lock:
+            self._entries = entries
+            self._names = names
+            self.built_at = time.monotonic()
+
+    def add(self, product_id, name):
+        with self._lock:
+            self._remove(product_id)
+            name = name[:MAX_NAME_LENGTH]
+            keys = keys_for(name)
+            if len(self._entries) + len(keys) > self.max_entries:
+                return
+            self._names[product_id] = name
+            for key in keys:
+                insort(self._entries, (key, product_id))
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        name = self._names.pop(product_id, None)
+        if name is None:
+            return
+        for key in keys_for(name):
+            position = bisect_left(self._entries, (key, product_id))
+            if position < len(self._entries) and self._entries[position] == (key, product_id):
+                del self._entries[position]
+
+    def suggest(self, prefix, limit=8):
+        prefix = normalize(prefix)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            entries = self._entries
+            position = bisect_left(entries, (prefix,))
+            # A product matches under at most MAX_KEYS_PER_PRODUCT keys
+            scan_end = min(len(entries), position + limit * MAX_KEYS_PER_PRODUCT)
+            while position < scan_end and len(results) < limit:
+                key, product_id = entries[position]
+                if not key.startswith(prefix):
+                    break
+                if product_id not in seen:
+                    seen.add(product_id)
+                    results.append({'id': product_id, 'name': self._names[product_id]})
+                position += 1
+        return results
+
+
+_index = PrefixIndex(getattr(settings, 'SUGGEST_INDEX_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+_build_lock = threading.Lock()
+
+
+def _build_index():
+    rows = (
+        Product.objects.filter(is_active=True)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'name')
+        .iterator(chunk_size=5000)
+    )
+    _index.build(rows)
+
+
+def _refresh_index():
+    try:
+        _build_index()
+    finally:
+        # The thread's own connection would otherwise stay open
+        connection.close()
+        _build_lock.release()
+
+
+def get_suggest_index():
+    """Return the process-wide index, building it when missing and refreshing it when stale"""
+    if _index.built_at is None:
+        with _build_lock:
+            if _index.built_at is None:
+                _build_index()
+        return _index
+    ttl = getattr(settings, 'SUGGEST_INDEX_TTL', DEFAULT_TTL)
+    # Whoever wins the lock starts the refresh; everyone keeps reading the stale index meanwhile
+    if time.monotonic() - _index.built_at > ttl and _build_lock.acquire(blocking=False):
+        if time.monotonic() - _index.built_at > ttl:
+            threading.Thread(target=_refresh_index, name='suggest-index-refresh', daemon=True).start()
+        else:
+            _build_lock.release()
+    return _index
+
+
+def update_product(product):
+    """Patch the index for a saved product; no-op until the index is built"""
+    if _index.built_at is None:
+        return
+    if product.is_active:
+        _index.add(product.pk, product.name)
+    else:
+        _index.remove(product.pk)
+
+
+def remove_product(product_id):
+    if _index.built_at is not None:
+        _index.remove(product_id)
@@ -1,3 +1,121 @@
-from django.test import TestCase
+import io
+import multiprocessing
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
 
-# Create your tests here.
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from project.uploads import RejectedUpload
+
+from .forms import ProductForm
+from .management.commands.benchmark_order_numbers import generate
+
+MB = 1024 * 1024
+BOUNDARY = 'upload-boundary'
+
+
+def small_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class MultipartStream:
+    """A multipart body with one ``image`` file of ``size`` bytes, produced as it is read"""
+
+    def __init__(self, head, size):
+        self.parts = [
+            (
+                f'--{BOUNDARY}\r\n'
+                f'Content-Disposition: form-data; name="image"; filename="big.png"\r\n'
+                f'Content-Type: image/png\r\n\r\n'
+            ).encode() + head,
+        ]
+        self.padding = size - len(head)
+        self.tail = f'\r\n--{BOUNDARY}--\r\n'.encode()
+        self.length = len(self.parts[0]) + self.padding + len(self.tail)
+        self.filler = b'\0' * (64 * 1024)
+
+    def read(self, size=-1):
+        if self.parts:
+            return self.parts.pop()
+        if self.padding:
+            chunk = self.filler[:min(self.padding, len(self.filler), size if size > 0 else len(self.filler))]
+            self.padding -= len(chunk)
+            return chunk
+        tail, self.tail = self.tail, b''
+        return tail
+
+    # LimitedStream wants it; the multipart parser only calls read()
+    readline = read
+
+
+def upload_request(head, size):
+    stream = MultipartStream(head, size)
+    return WSGIRequest({
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/seller/products/add/',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+        'CONTENT_LENGTH': str(stream.length),
+        'wsgi.input': stream,
+    })
+
+
+class BoundedUploadTests(SimpleTestCase):
+    def validate(self, head, size):
+        """Parse and validate an upload under tracemalloc; returns the form and the peak in bytes"""
+        tracemalloc.start()
+        try:
+            request = upload_request(head, size)
+            form = ProductForm(
+                {'name': 'Racket', 'description': 'd', 'price': '1', 'stock_quantity': '1'},
+                request.FILES,
+            )
+            form.is_valid()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.addCleanup(request.FILES['image'].close)
+        return form, peak
+
+    def test_oversized_upload_is_dropped_and_reported_as_too_large(self):
+        form, peak = self.validate(small_png(), 50 * MB)
+
+        self.assertIsInstance(form.files['image'], RejectedUpload)
+        self.assertLess(peak, 5 * MB)
+        self.assertTrue(form.has_error('image', 'file_too_large'))
+        self.assertEqual(form.errors['image'], ["File too large (max 15 MB)."])
+
+    @override_settings(MAX_UPLOAD_SIZE=60 * MB)
+    def test_large_accepted_upload_is_spooled_to_disk(self):
+        form, peak = self.validate(small_png(), 50 * MB)
+
+        self.assertTrue(hasattr(form.files['image'], 'temporary_file_path'))
+        self.assertEqual(form.files['image'].size, 50 * MB)
+        self.assertLess(peak, 5 * MB)
+        self.assertNotIn('image', form.errors)
+
+
+class OrderNumberCollisionTests(TransactionTestCase):
+    processes = 3
+    count = 10_000
+
+    def test_processes_never_share_a_number(self):
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(generate, self.count, 100, 97) for _ in range(self.processes)]
+            results = [future.result() for future in futures]
+
+        numbers = [number for result in results for number in result]
+        self.assertEqual(len(numbers), len(set(numbers)))
+        for result in results:
+            # Every 97th number was taken in a rolled back transaction and dropped
+            self.assertEqual(len(result), self.count - len(range(0, self.count, 97)))
+            self.assertEqual(result, sorted(result))
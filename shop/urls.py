@@ -5,6 +5,7 @@ app_name = "shop"
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('sales/', views.sales_series, name='sales_series'),
     path('products/', views.product_list, name='product_list'),
     path('products/add/', views.add_product, name='add_product'),
     path('products/edit/<int:product_id>/', views.edit_product, name='edit_product'),
@@ -12,6 +13,8 @@ urlpatterns = [
     
     # Orders URLs
     path('orders/', views.order_list, name='order_list'),
+    path('orders/export/', views.export_orders, name='export_orders'),
+    path('orders/bulk-update-status/', views.bulk_update_order_status, name='bulk_update_order_status'),
     path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
     path('orders/<int:order_id>/update-status/', views.update_order_status, name='update_order_status'),
 ]
\ No newline at end of file
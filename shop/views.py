@@ -1,8 +1,23 @@
+from datetime import date, timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from django.views.decorators.http import require_POST
+from .exports import csv_lines, order_items
 from .models import Product, Order
+from .order_status import ADVANCE, MAX_BULK_ORDERS, change_order_statuses
+from .sales import seller_sales_series
+from .stats import dashboard_counts, order_status_counts
 from .forms import ProductForm
+from project.pagination import paginate
+
+SALES_SERIES_DAYS = 30
+MAX_SALES_SERIES_DAYS = 365
 
 @login_required
 def dashboard(request):
@@ -10,25 +25,43 @@ def dashboard(request):
         messages.error(request, "Access denied. Seller account required.")
         return redirect('accounts:retail_admin_login')
     
-    # Get seller's stats
-    total_products = Product.objects.filter(seller=request.user).count()
-    active_products = Product.objects.filter(seller=request.user, is_active=True).count()
-    low_stock_products = Product.objects.filter(seller=request.user, stock_quantity__lt=5, stock_quantity__gt=0)
+    # Product and order counts come back in one query
+    context = dashboard_counts(request.user)
+    context.update({
+        'low_stock_products': Product.objects.filter(seller=request.user, stock_quantity__lt=5, stock_quantity__gt=0),
+        'recent_orders': Order.objects.filter(seller=request.user).order_by('-created_at')[:5],
+    })
+    return render(request, 'shop/dashboard.html', context)
+
+@login_required
+def sales_series(request):
+    if not request.user.is_seller():
+        return JsonResponse({'error': 'Access denied'}, status=403)
     
-    # Get orders stats
-    total_orders = Order.objects.filter(seller=request.user).count()
-    pending_orders = Order.objects.filter(seller=request.user, status='pending').count()
-    recent_orders = Order.objects.filter(seller=request.user).order_by('-created_at')[:5]
+    try:
+        days = min(max(int(request.GET.get('days', SALES_SERIES_DAYS)), 1), MAX_SALES_SERIES_DAYS)
+        product_id = int(request.GET['product']) if request.GET.get('product') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
     
-    context = {
-        'total_products': total_products,
-        'active_products': active_products,
-        'low_stock_products': low_stock_products,
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'recent_orders': recent_orders,
-    }
-    return render(request, 'shop/dashboard.html', context)
+    # Served from the SellerSalesDay rollup, never from the order tables
+    last_day = timezone.localdate()
+    series = seller_sales_series(request.user, last_day - timedelta(days=days - 1), last_day, product_id)
+    return JsonResponse({
+        'days': days,
+        'product': product_id,
+        'units': sum(point['units'] for point in series),
+        'revenue': str(sum(point['revenue'] for point in series)),
+        'series': [
+            {
+                'day': point['day'].isoformat(),
+                'units': point['units'],
+                'revenue': str(point['revenue']),
+                'orders': point['orders'],
+            }
+            for point in series
+        ],
+    })
 
 @login_required
 def order_list(request):
@@ -43,18 +76,12 @@ def order_list(request):
     if status_filter:
         orders = orders.filter(status=status_filter)
     
-    # Calculate status counts for the filter
-    all_orders = Order.objects.filter(seller=request.user)
-    status_counts = {
-        'pending': all_orders.filter(status='pending').count(),
-        'confirmed': all_orders.filter(status='confirmed').count(),
-        'shipped': all_orders.filter(status='shipped').count(),
-        'delivered': all_orders.filter(status='delivered').count(),
-        'cancelled': all_orders.filter(status='cancelled').count(),
-    }
+    # One conditional aggregation for every status count
+    status_counts = order_status_counts(request.user)
     
     context = {
         'orders': orders,
+        'order_count': status_counts.get(status_filter, 0) if status_filter else status_counts['total'],
         'status_filter': status_filter,
         'status_choices': Order.STATUS_CHOICES,
         'pending_count': status_counts['pending'],
@@ -65,6 +92,29 @@ def order_list(request):
     }
     return render(request, 'shop/order_list.html', context)
 
+@login_required
+def export_orders(request):
+    if not request.user.is_seller():
+        messages.error(request, "Access denied. Seller account required.")
+        return redirect('accounts:retail_admin_login')
+    
+    status_filter = request.GET.get('status') or None
+    try:
+        since = date.fromisoformat(request.GET['from']) if request.GET.get('from') else None
+        until = date.fromisoformat(request.GET['to']) if request.GET.get('to') else None
+    except ValueError:
+        messages.error(request, "Dates must look like YYYY-MM-DD.")
+        return redirect('shop:order_list')
+    if status_filter and status_filter not in dict(Order.STATUS_CHOICES):
+        messages.error(request, "Invalid status selected.")
+        return redirect('shop:order_list')
+    
+    # Rows are written out as the database returns them, never all at once
+    items = order_items(request.user, status_filter, since, until)
+    response = StreamingHttpResponse(csv_lines(items), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="orders-{timezone.localdate():%Y%m%d}.csv"'
+    return response
+
 @login_required
 def order_detail(request, order_id):
     if not request.user.is_seller():
@@ -75,15 +125,8 @@ def order_detail(request, order_id):
     
     if request.method == 'POST':
         # Handle status update from order detail page
-        new_status = request.POST.get('status')
-        if new_status in dict(Order.STATUS_CHOICES):
-            old_status = order.status
-            order.status = new_status
-            order.save()
-            messages.success(request, f"Order #{order.order_number} status updated from {old_status} to {new_status}")
+        if _change_status(request, order):
             return redirect('shop:order_detail', order_id=order_id)
-        else:
-            messages.error(request, "Invalid status selected.")
     
     context = {
         'order': order,
@@ -99,17 +142,81 @@ def update_order_status(request, order_id):
     order = get_object_or_404(Order, id=order_id, seller=request.user)
     
     if request.method == 'POST':
-        new_status = request.POST.get('status')
-        if new_status in dict(Order.STATUS_CHOICES):
-            old_status = order.status
-            order.status = new_status
-            order.save()
-            messages.success(request, f"Order #{order.order_number} status updated from {old_status} to {new_status}")
-        else:
-            messages.error(request, "Invalid status selected.")
+        _change_status(request, order)
     
     return redirect('shop:order_detail', order_id=order_id)
 
+@login_required
+@require_POST
+def bulk_update_order_status(request):
+    if not request.user.is_seller():
+        messages.error(request, "Access denied. Seller account required.")
+        return redirect('accounts:retail_admin_login')
+    
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+    order_ids = [int(order_id) for order_id in request.POST.getlist('order_ids') if order_id.isdigit()]
+    action = request.POST.get('action', ADVANCE)
+    
+    if not order_ids or len(order_ids) > MAX_BULK_ORDERS:
+        error = f"Select between 1 and {MAX_BULK_ORDERS} orders."
+        if wants_json:
+            return JsonResponse({'success': False, 'error': error}, status=400)
+        messages.error(request, error)
+        return _back_to_order_list(request)
+    
+    changes = change_order_statuses(request.user, list(dict.fromkeys(order_ids)), action)
+    updated = [change for change in changes if change.ok]
+    failed = [change for change in changes if not change.ok]
+    
+    if wants_json:
+        return JsonResponse({
+            'success': not failed,
+            'updated': len(updated),
+            'failed': len(failed),
+            'results': [
+                {
+                    'order_id': change.order_id,
+                    'order_number': change.order_number,
+                    'old_status': change.old_status,
+                    'new_status': change.new_status,
+                    'error': change.error,
+                }
+                for change in changes
+            ],
+        })
+    
+    moved = {}
+    for change in updated:
+        moved[change.new_status] = moved.get(change.new_status, 0) + 1
+    for new_status, count in moved.items():
+        messages.success(request, f"{count} order{'s' if count != 1 else ''} moved to {new_status}.")
+    if failed:
+        skipped = ', '.join(f"#{change.order_number or change.order_id} ({change.error})" for change in failed[:10])
+        if len(failed) > 10:
+            skipped += f" and {len(failed) - 10} more"
+        messages.warning(request, f"{len(failed)} order{'s' if len(failed) != 1 else ''} not updated: {skipped}")
+    return _back_to_order_list(request)
+
+def _change_status(request, order):
+    """Apply the posted status to one order through the same guarded path as bulk updates"""
+    new_status = request.POST.get('status')
+    if new_status not in dict(Order.STATUS_CHOICES):
+        messages.error(request, "Invalid status selected.")
+        return False
+    [change] = change_order_statuses(request.user, [order.id], new_status)
+    if not change.ok:
+        messages.error(request, f"Order #{order.order_number} not updated: {change.error}")
+        return False
+    messages.success(request, f"Order #{order.order_number} status updated from {change.old_status} to {change.new_status}")
+    return True
+
+
+def _back_to_order_list(request):
+    status_filter = request.POST.get('status_filter')
+    if status_filter:
+        return redirect(f"{reverse('shop:order_list')}?{urlencode({'status': status_filter})}")
+    return redirect('shop:order_list')
+
 
 
 
@@ -120,10 +227,11 @@ def product_list(request):
         messages.error(request, "Access denied. Seller account required.")
         return redirect('accounts:retail_admin_login')
     
-    products = Product.objects.filter(seller=request.user)
+    page = paginate(request, Product.objects.filter(seller=request.user))
     
     context = {
-        'products': products,
+        'products': page,
+        'page': page,
     }
     return render(request, 'shop/product_list.html', context)
 
@@ -0,0 +1,46 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from project.thumbnails import best_rendition
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(image, box, extension='jpg'):
+    """
+    URL of the ``extension`` rendition of ``image`` best suited to a ``box``
+    pixel slot; the original is returned until the renditions exist.
+    """
+    if not image:
+        return ''
+    name = best_rendition(image.name, int(box), extension)
+    if name is None:
+        return image.url
+    return default_storage.url(name)
+
+
+@register.simple_tag
+def picture(image, box, **attrs):
+    """
+    An ``<img>`` for ``image`` sized for a ``box`` pixel slot, wrapped in a
+    ``<picture>`` that offers the WebP rendition to browsers that take it.
+
+    The choice is left to the browser, so the page is the same for every
+    client and safe to cache. Keyword arguments become attributes of the
+    ``<img>``.
+    """
+    if not image:
+        return ''
+    box = int(box)
+    img = format_html('<img src="{}"{}>', thumbnail_url(image, box, 'jpg'), flatatt(attrs))
+    webp = best_rendition(image.name, box, 'webp')
+    if webp is None:
+        return img
+    # display: contents keeps the wrapper out of layout, so the img sizes as before
+    return format_html(
+        '<picture style="display: contents"><source type="image/webp" srcset="{}">{}</picture>',
+        default_storage.url(webp), img,
+    )